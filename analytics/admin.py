@@ -1,13 +1,19 @@
 from django.contrib import admin
 from django.urls import reverse
 from django.utils.html import format_html
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 import csv
+from io import StringIO
+from itertools import islice
 from typing import Iterable
 
 from .models import BotEvent
 
 
+# Сколько строк CSV пишем и отдаём клиенту за один раз
+EXPORT_CHUNK_SIZE = 500
+
+
 @admin.register(BotEvent)
 class BotEventAdmin(admin.ModelAdmin):
     # --- список ---
@@ -17,7 +23,7 @@ class BotEventAdmin(admin.ModelAdmin):
         "event_label_ru",
         "payload_summary_col",
     )
-    list_filter = ("event_type", "created_at")
+    list_filter = ("event_type", "payload_kind", "created_at")
     search_fields = ("user__telegram_id", "user__username", "payload")
     ordering = ("-created_at",)
     date_hierarchy = "created_at"
@@ -51,12 +57,16 @@ class BotEventAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # user_link читает obj.user на каждой строке списка
+        return super().get_queryset(request).select_related("user")
+
     # ======================
     # Helpers для admin
     # ======================
 
     def short_created(self, obj: BotEvent) -> str:
-        return obj.created_at.strftime("%Y-%m-%d %H:%M")
+        return obj.created_label
 
     short_created.short_description = "Дата"
     short_created.admin_order_field = "created_at"
@@ -103,29 +113,44 @@ class BotEventAdmin(admin.ModelAdmin):
     actions = ["export_selected_events_csv"]
 
     def export_selected_events_csv(self, request, queryset: Iterable[BotEvent]):
-        qs = queryset.order_by("created_at")
-        response = HttpResponse(content_type="text/csv; charset=utf-8")
-        response["Content-Disposition"] = 'attachment; filename="bot_events.csv"'
+        qs = queryset.select_related("user").order_by("created_at")
 
-        writer = csv.writer(response)
-        writer.writerow([
-            "Дата",
-            "Telegram ID",
-            "Username",
-            "Событие",
-            "Описание",
-            "Payload",
-        ])
-
-        for e in qs:
+        def rows():
+            buffer = StringIO()
+            writer = csv.writer(buffer)
             writer.writerow([
-                e.created_at.isoformat(),
-                e.user.telegram_id if e.user else "",
-                e.user.username if e.user else "",
-                e.get_event_label_ru(),
-                e.payload_summary(),
-                e.payload_pretty(),
+                "Дата",
+                "Telegram ID",
+                "Username",
+                "Событие",
+                "Описание",
+                "Payload",
             ])
+
+            events = (
+                (
+                    e.created_at.isoformat(),
+                    e.user.telegram_id if e.user else "",
+                    e.user.username if e.user else "",
+                    e.get_event_label_ru(),
+                    e.payload_summary(),
+                    e.payload_pretty(),
+                )
+                for e in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+            )
+
+            # writerows() гоняет цикл в C; отдаём клиенту по EXPORT_CHUNK_SIZE строк
+            while True:
+                writer.writerows(islice(events, EXPORT_CHUNK_SIZE))
+                chunk = buffer.getvalue()
+                if not chunk:
+                    return
+                yield chunk
+                buffer.seek(0)
+                buffer.truncate(0)
+
+        response = StreamingHttpResponse(rows(), content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = 'attachment; filename="bot_events.csv"'
         return response
 
     export_selected_events_csv.short_description = "Экспортировать выбранные события в CSV"
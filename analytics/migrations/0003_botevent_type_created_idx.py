@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-15 21:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_alter_botevent_payload'),
+        ('billing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='botevent',
+            name='event_type',
+            field=models.CharField(choices=[('start', 'Start'), ('help', 'Help'), ('info', 'Info'), ('search', 'Search query'), ('search_result', 'Search result shown'), ('premium_open', 'Premium opened'), ('premium_click', 'Premium plan clicked'), ('invoice_sent', 'Invoice sent'), ('precheckout_ok', 'PreCheckout OK'), ('precheckout_fail', 'PreCheckout FAIL'), ('payment_success', 'Payment success'), ('payment_fail', 'Payment fail')], db_index=True, max_length=32, verbose_name='Тип события'),
+        ),
+        migrations.AddIndex(
+            model_name='botevent',
+            index=models.Index(fields=['event_type', '-created_at'], name='botev_type_created_idx'),
+        ),
+    ]
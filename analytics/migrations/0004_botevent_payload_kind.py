@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-15 21:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_botevent_type_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='botevent',
+            name='payload_kind',
+            field=models.CharField(blank=True, choices=[('query', 'Запрос'), ('result', 'Результат поиска'), ('plan', 'Тариф'), ('pay', 'Оплата'), ('err', 'Ошибка')], db_index=True, default='', max_length=8, verbose_name='Вид данных'),
+        ),
+    ]
@@ -1,8 +1,86 @@
+import json
+from types import MappingProxyType
 from typing import Any, Dict
 from django.db import models
 from django.utils import timezone
+from django.utils.functional import cached_property
 from billing.models import TelegramUser
 
+# Пустой payload по умолчанию (только для чтения: json.dumps его не меняет)
+_EMPTY: Dict[str, Any] = {}
+
+
+# ---- payload_summary: рендер по виду payload ----
+def payload_kind_for(p: Dict[str, Any] | None) -> str:
+    """
+    Вид payload (для BotEvent.payload_kind) — считается один раз при записи события.
+    Порядок проверок = приоритет в payload_summary.
+    """
+    p = p or _EMPTY
+    if p.get("query"):
+        return "query"
+    if "found" in p:
+        return "result"
+    if p.get("plan_code"):
+        return "plan"
+    if p.get("amount") is not None:
+        return "pay"
+    if p.get("error"):
+        return "err"
+    return ""
+
+
+def _render_query(p: Dict[str, Any]) -> str:
+    q = str(p.get("query")).strip()
+    return f'Запрос: "{q}"' if q else "Запрос"
+
+
+def _render_result(p: Dict[str, Any]) -> str:
+    found = p.get("found")
+    cnt = p.get("results_count")
+    if cnt is not None:
+        return f'Результат: {"Да" if found else "Нет"}, вариантов: {cnt}'
+    return f'Результат: {"Да" if found else "Нет"}'
+
+
+def _render_plan(p: Dict[str, Any]) -> str:
+    code = p.get("plan_code")
+    price = p.get("price") or p.get("amount")
+    if price is not None:
+        return f"План: {code} — {price} ⭐"
+    return f"План: {code}"
+
+
+def _render_pay(p: Dict[str, Any]) -> str:
+    return f"Оплата: {p.get('amount')}"
+
+
+def _render_err(p: Dict[str, Any]) -> str:
+    return f"Ошибка: {p.get('error')}"
+
+
+def _render_raw(p: Dict[str, Any]) -> str:
+    if p:
+        s = str(p)
+        if len(s) > 200:
+            return s[:197] + "…"
+        return s
+    return ""
+
+
+_KIND_RENDERERS = {
+    "query": _render_query,
+    "result": _render_result,
+    "plan": _render_plan,
+    "pay": _render_pay,
+    "err": _render_err,
+}
+
+
+def _render_fallback(p: Dict[str, Any]) -> str:
+    # события без payload_kind (записанные до появления поля)
+    return _KIND_RENDERERS.get(payload_kind_for(p), _render_raw)(p)
+
 
 class BotEvent(models.Model):
     class EventType(models.TextChoices):
@@ -23,6 +101,13 @@ class BotEvent(models.Model):
         PAYMENT_SUCCESS = "payment_success", "Payment success"
         PAYMENT_FAIL = "payment_fail", "Payment fail"
 
+    class PayloadKind(models.TextChoices):
+        QUERY = "query", "Запрос"
+        RESULT = "result", "Результат поиска"
+        PLAN = "plan", "Тариф"
+        PAY = "pay", "Оплата"
+        ERR = "err", "Ошибка"
+
     user = models.ForeignKey(
         TelegramUser,
         on_delete=models.CASCADE,
@@ -44,6 +129,15 @@ class BotEvent(models.Model):
         help_text="Произвольные данные: query, plan_code, amount, errors и т.д.",
     )
 
+    payload_kind = models.CharField(
+        "Вид данных",
+        max_length=8,
+        choices=PayloadKind.choices,
+        blank=True,
+        default="",
+        db_index=True,
+    )
+
     created_at = models.DateTimeField(
         "Дата события",
         auto_now_add=True,
@@ -54,12 +148,22 @@ class BotEvent(models.Model):
         verbose_name = "Событие бота"
         verbose_name_plural = "События бота"
         ordering = ("-created_at",)
+        indexes = [
+            # фильтр по типу + сортировка по дате в админке
+            models.Index(fields=["event_type", "-created_at"], name="botev_type_created_idx"),
+        ]
 
     def __str__(self) -> str:
-        return f"{self.created_at:%Y-%m-%d %H:%M} — {self.get_event_label_ru()}"
+        return f"{self.created_label} — {self.get_event_label_ru()}"
+
+    @cached_property
+    def created_label(self) -> str:
+        # форматируем дату один раз на объект: __str__ + колонка в админке
+        return self.created_at.strftime("%Y-%m-%d %H:%M")
 
     # ---- human friendly helpers ----
-    EVENT_LABELS_RU = {
+    # только для чтения: словарь-константа класса
+    EVENT_LABELS_RU = MappingProxyType({
         "start": "Старт бота",
         "help": "Помощь",
         "info": "Информация",  # <-- добавлено
@@ -72,50 +176,17 @@ class BotEvent(models.Model):
         "precheckout_fail": "PreCheckout — ошибка",
         "payment_success": "Успешная оплата",
         "payment_fail": "Ошибка оплаты",
-    }
+    })
+    _get_label_ru = staticmethod(EVENT_LABELS_RU.get)
 
     def get_event_label_ru(self) -> str:
-        return self.EVENT_LABELS_RU.get(self.event_type, self.event_type)
+        return type(self)._get_label_ru(self.event_type, self.event_type)
 
     def payload_summary(self) -> str:
-        p: Dict[str, Any] = self.payload or {}
-
-        if p.get("query"):
-            q = str(p.get("query")).strip()
-            return f'Запрос: "{q}"' if q else "Запрос"
-
-        if "found" in p:
-            found = p.get("found")
-            cnt = p.get("results_count")
-            if cnt is not None:
-                return f'Результат: {"Да" if found else "Нет"}, вариантов: {cnt}'
-            return f'Результат: {"Да" if found else "Нет"}'
-
-        if p.get("plan_code"):
-            code = p.get("plan_code")
-            price = p.get("price") or p.get("amount")
-            if price is not None:
-                return f"План: {code} — {price} ⭐"
-            return f"План: {code}"
-
-        if p.get("amount") is not None:
-            return f"Оплата: {p.get('amount')}"
-
-        if p.get("error"):
-            err = p.get("error")
-            return f"Ошибка: {err}"
-
-        if p:
-            s = str(p)
-            if len(s) > 200:
-                return s[:197] + "…"
-            return s
-
-        return ""
+        return _KIND_RENDERERS.get(self.payload_kind, _render_fallback)(self.payload or _EMPTY)
 
     def payload_pretty(self) -> str:
-        import json
-        p = self.payload or {}
+        p = self.payload or _EMPTY
         try:
             return json.dumps(p, ensure_ascii=False, indent=2)
         except Exception:
@@ -1,17 +1,107 @@
+import asyncio
+import logging
+from typing import List, Optional
+
 from asgiref.sync import sync_to_async
-from .models import BotEvent
+from .models import BotEvent, payload_kind_for
 
+logger = logging.getLogger(__name__)
 
-def _log_event_sync(user, event_type: str, payload: dict | None = None) -> BotEvent:
-    """
-    Синхронная версия — создаёт запись.
-    """
-    return BotEvent.objects.create(
+# Сколько событий максимум пишем одним INSERT
+EVENT_BATCH_SIZE = 100
+
+# Очередь событий бота; пишет её run_event_flusher()
+_events: "asyncio.Queue[Optional[BotEvent]]" = asyncio.Queue()
+# Сигнал остановки в очереди: flusher дописывает всё, что было до него, и выходит
+_STOP = None
+
+
+def _build_event(user, event_type: str, payload: dict | None = None) -> BotEvent:
+    payload = payload or {}
+    return BotEvent(
         user=user,
         event_type=event_type,
-        payload=payload or {},
+        payload=payload,
+        payload_kind=payload_kind_for(payload),
     )
 
 
-# Асинхронный обёртка для использования в aiogram (вызов await log_event(...))
-log_event = sync_to_async(_log_event_sync, thread_sensitive=True)
+def _bulk_create_sync(batch: List[BotEvent]) -> None:
+    BotEvent.objects.bulk_create(batch, batch_size=EVENT_BATCH_SIZE)
+
+
+_bulk_create = sync_to_async(_bulk_create_sync, thread_sensitive=True)
+
+
+async def log_event(user, event_type: str, payload: dict | None = None) -> None:
+    """
+    Асинхронная версия для aiogram (await log_event(...)).
+    Не ходит в БД: кладёт событие в очередь, запись — пачками в run_event_flusher().
+    Ошибки не пробрасывает: аналитика не должна мешать ответу пользователю.
+    """
+    try:
+        _events.put_nowait(_build_event(user, event_type, payload))
+    except Exception:
+        logger.exception("Failed to queue bot event %s", event_type)
+
+
+def _drain(batch: List[BotEvent]) -> bool:
+    """
+    Добирает в batch уже накопившиеся события (до EVENT_BATCH_SIZE).
+    True — встретился сигнал остановки.
+    """
+    while len(batch) < EVENT_BATCH_SIZE:
+        try:
+            event = _events.get_nowait()
+        except asyncio.QueueEmpty:
+            return False
+        if event is _STOP:
+            return True
+        batch.append(event)
+    return False
+
+
+async def _write(batch: List[BotEvent]) -> None:
+    try:
+        await _bulk_create(batch)
+    except Exception:
+        # аналитика не должна ронять бота
+        logger.exception("Failed to write %d bot events", len(batch))
+
+
+async def run_event_flusher() -> None:
+    """
+    Фоновая задача: ждёт первое событие, добирает всё, что уже накопилось
+    (до EVENT_BATCH_SIZE), и пишет пачку одним bulk_create.
+    Не отменяется: останавливается через stop_event_flusher(), дописав текущую пачку.
+    """
+    while True:
+        event = await _events.get()
+        if event is _STOP:
+            return
+        batch = [event]
+        stop = _drain(batch)
+        await _write(batch)
+        if stop:
+            return
+
+
+async def stop_event_flusher(flusher: "asyncio.Task[None]") -> None:
+    """
+    Остановка бота: сигнал в очередь и ожидание flusher — пачка, которая
+    сейчас пишется, не теряется. Опоздавшие события дописывает flush_events().
+    """
+    _events.put_nowait(_STOP)
+    await flusher
+    await flush_events()
+
+
+async def flush_events() -> None:
+    """
+    Дописывает всё, что осталось в очереди (при остановке бота).
+    """
+    while not _events.empty():
+        batch: List[BotEvent] = []
+        _drain(batch)
+        if batch:
+            await _write(batch)
@@ -0,0 +1,28 @@
+import orjson
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import JSONRenderer
+
+# типы, которых orjson не знает (Decimal, lazy-строки и т.п.), кодируем как DRF
+_drf_default = JSONEncoder().default
+
+# DRF экранирует U+2028/U+2029 (для JSON внутри <script>), orjson — нет
+_LINE_SEP = "\u2028".encode("utf-8")
+_PARA_SEP = "\u2029".encode("utf-8")
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson: тот же компактный UTF-8 JSON, но кодирование целиком в C.
+    С отступами (browsable API, "; indent=" в Accept) — штатный рендер DRF.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None) -> bytes:
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=_drf_default)
+        if _LINE_SEP in ret or _PARA_SEP in ret:
+            ret = ret.replace(_LINE_SEP, b"\\u2028").replace(_PARA_SEP, b"\\u2029")
+        return ret
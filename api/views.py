@@ -1,9 +1,19 @@
-from typing import Any, Dict, List, Tuple
-
+import hashlib
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, When
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import etag
+from django.views.decorators.vary import vary_on_headers
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
+from catalog.cache import catalog_version
 from catalog.models import Glass, GlassAlias, GlassGroup
 
 
@@ -11,22 +21,31 @@ def normalize(q: str) -> str:
     return " ".join((q or "").strip().lower().split())
 
 
-def _group_payload(group: GlassGroup) -> Dict[str, Any]:
-    return {
-        "id": group.id,
-        "name": group.name,
-        "brands": getattr(group, "brands", "") or "",
-        "description": getattr(group, "description", "") or "",
-        "external_id": getattr(group, "external_id", "") or "",
-    }
+def _search_cache_key(q: str) -> str:
+    # name__iexact/icontains регистронезависимы, поэтому ключ — q в нижнем регистре
+    digest = hashlib.md5(q.lower().encode("utf-8")).hexdigest()
+    return f"search:{catalog_version()}:{digest}"
 
 
-def _brands_has_common(brands: str) -> bool:
-    b = (brands or "").strip()
-    if not b:
-        return False
-    parts = [p.strip().lower() for p in b.split(",") if p.strip()]
-    return "общие" in parts
+def _search_etag(request, *args, **kwargs) -> Optional[str]:
+    # ответ зависит только от URL (q) и версии каталога; без q — 400, ETag не нужен.
+    # Версия живёт в памяти процесса и не видит правок из других процессов,
+    # поэтому валидатор сменяется не реже раза в SEARCH_CACHE_TTL
+    if not normalize(request.GET.get("q", "")):
+        return None
+    window = int(time.time()) // max(1, settings.SEARCH_CACHE_TTL)
+    return f'W/"{catalog_version()}-{window}"'
+
+
+def _group_payload(group: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": group["id"],
+        "name": group["name"],
+        "brands": group["brands"] or "",
+        "description": group["description"] or "",
+        "external_id": group["external_id"] or "",
+        "brands_has_common": bool(group["brands_has_common"]),
+    }
 
 
 class SearchView(APIView):
@@ -41,6 +60,9 @@ class SearchView(APIView):
     но сортировку "ОБЩИЕ" делаем уже здесь (на API-уровне).
     """
 
+    # If-None-Match с текущей версией каталога -> 304 без поиска и сериализации
+    @method_decorator(vary_on_headers("Accept"))  # JSON и browsable API — разные тела
+    @method_decorator(etag(_search_etag))
     def get(self, request):
         q = request.query_params.get("q", "")
         q_stripped = (q or "").strip()
@@ -52,48 +74,60 @@ class SearchView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Только активные
-        alias_base = GlassAlias.objects.select_related("glass", "glass__group").filter(
-            glass__is_active=True,
-            glass__group__is_active=True,
-        )
+        cache_key = _search_cache_key(q_stripped)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return Response({**cached, "query": q_stripped}, status=status.HTTP_200_OK)
 
-        glass_base = Glass.objects.select_related("group").filter(
-            is_active=True,
-            group__is_active=True,
-        )
+        payload = self._search(q_stripped, qn)
+        cache.set(cache_key, payload, timeout=settings.SEARCH_CACHE_TTL)
+        return Response(payload, status=status.HTTP_200_OK)
 
-        # Алиасы (приоритетнее)
-        alias_exact = alias_base.filter(normalized_alias=qn)
-        alias_starts = alias_base.filter(normalized_alias__startswith=qn).exclude(normalized_alias=qn)
-        alias_contains = (
-            alias_base
-            .filter(normalized_alias__icontains=qn)
-            .exclude(normalized_alias=qn)
-            .exclude(normalized_alias__startswith=qn)
+    def _search(self, q_stripped: str, qn: str) -> Dict[str, Any]:
+        # Только активные
+        # Алиасы (приоритетнее): exact=0, startswith=1, contains=2 — одним запросом
+        alias_rows = (
+            GlassAlias.objects
+            .filter(
+                glass__is_active=True,
+                glass__group__is_active=True,
+                # qn и normalized_alias уже в нижнем регистре: обычный LIKE '%q%'
+                # (без UPPER), его обслуживает trigram-индекс в Postgres
+                normalized_alias__contains=qn,
+            )
+            .annotate(score=Case(
+                When(normalized_alias=qn, then=0),
+                When(normalized_alias__startswith=qn, then=1),
+                default=2,
+                output_field=IntegerField(),
+            ))
+            .order_by("score", "alias")
+            .values_list("score", "glass__group_id", "glass__name")
         )
 
-        # Название стекла
-        name_exact = glass_base.filter(name__iexact=q_stripped)
-        name_contains = glass_base.filter(name__icontains=q_stripped).exclude(name__iexact=q_stripped)
+        # Название стекла: iexact=3, icontains=4 — одним запросом
+        name_rows = (
+            Glass.objects
+            .filter(
+                is_active=True,
+                group__is_active=True,
+                name__icontains=q_stripped,
+            )
+            .annotate(score=Case(
+                When(name__iexact=q_stripped, then=3),
+                default=4,
+                output_field=IntegerField(),
+            ))
+            .order_by("score", "name")
+            .values_list("score", "group_id", "name")
+        )
 
         # candidates: (score, group_id, matched_glass_name)
-        candidates: List[Tuple[int, int, str]] = []
-
-        for a in alias_exact:
-            candidates.append((0, a.glass.group_id, a.glass.name))
-        for a in alias_starts:
-            candidates.append((1, a.glass.group_id, a.glass.name))
-        for a in alias_contains:
-            candidates.append((2, a.glass.group_id, a.glass.name))
-
-        for g in name_exact:
-            candidates.append((3, g.group_id, g.name))
-        for g in name_contains:
-            candidates.append((4, g.group_id, g.name))
+        candidates: List[Tuple[int, int, str]] = list(alias_rows)
+        candidates.extend(name_rows)
 
         if not candidates:
-            return Response({"found": False, "query": q_stripped}, status=status.HTTP_200_OK)
+            return {"found": False, "query": q_stripped}
 
         # лучшее совпадение на группу
         best_by_group: Dict[int, Tuple[int, str]] = {}
@@ -101,54 +135,39 @@ class SearchView(APIView):
             if group_id not in best_by_group or score < best_by_group[group_id][0]:
                 best_by_group[group_id] = (score, matched_name)
 
-        # подтянуть группы
         group_ids = list(best_by_group.keys())
-        groups = (
+
+        # подтянуть группы (словарями, без моделей)
+        groups = list(
             GlassGroup.objects
             .filter(id__in=group_ids, is_active=True)
-            .prefetch_related("glasses")
+            .values("id", "name", "brands", "description", "external_id", "brands_has_common")
         )
-        groups_by_id = {g.id: g for g in groups}
-
-        # сортировка:
+        # сортировка в Python: CASE по каждой группе в SQL растёт квадратично
         # 1) бренды содержат "ОБЩИЕ" -> первыми
         # 2) score
         # 3) id
-        def _sort_gid(gid: int):
-            grp = groups_by_id.get(gid)
-            brands = (getattr(grp, "brands", "") or "") if grp else ""
-            is_common = _brands_has_common(brands)
-            score = best_by_group[gid][0]
-            return (0 if is_common else 1, score, gid)
-
-        group_ids_sorted = sorted(
-            [gid for gid in group_ids if gid in groups_by_id],
-            key=_sort_gid
-        )
+        groups.sort(key=lambda g: (not g["brands_has_common"], best_by_group[g["id"]][0], g["id"]))
+
+        # активные стёкла всех найденных групп — одним запросом
+        glasses_by_group: Dict[int, List[str]] = defaultdict(list)
+        for group_id, name in (
+            Glass.objects
+            .filter(is_active=True, group_id__in=group_ids)
+            .order_by("name")
+            .values_list("group_id", "name")
+        ):
+            glasses_by_group[group_id].append(name)
 
         results: List[Dict[str, Any]] = []
-        for gid in group_ids_sorted:
-            group = groups_by_id.get(gid)
-            if not group:
-                continue
-
-            compatible = list(
-                group.glasses
-                .filter(is_active=True)
-                .order_by("name")
-                .values_list("name", flat=True)
-            )
-
+        for group in groups:
             results.append({
-                "matched_glass": best_by_group[gid][1],
+                "matched_glass": best_by_group[group["id"]][1],
                 "group": _group_payload(group),
-                "compatible_glasses": compatible,
+                "compatible_glasses": glasses_by_group[group["id"]],
             })
 
         if not results:
-            return Response({"found": False, "query": q_stripped}, status=status.HTTP_200_OK)
+            return {"found": False, "query": q_stripped}
 
-        return Response(
-            {"found": True, "query": q_stripped, "results": results},
-            status=status.HTTP_200_OK
-        )
+        return {"found": True, "query": q_stripped, "results": results}
@@ -1,20 +1,49 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Tuple
+
+from shared.brands import brands_has_common
 
 
 def _safe(s: Any) -> str:
     return (s or "").strip() if isinstance(s, str) else ""
 
 
-def _brands_has_common(brands: str) -> bool:
+_NOT_FOUND_TEMPLATE = (
+    "❌ <b>Совпадений не найдено</b>\n\n"
+    "{q_part}"
+    "Что можно сделать:\n"
+    "• попробуйте другое написание.\n"
+)
+
+
+def _format_not_found(data: Dict[str, Any]) -> str:
+    q = _safe(data.get("query"))
+    q_part = f"🔎 Запрос: <b>{q}</b>\n\n" if q else ""
+    return _NOT_FOUND_TEMPLATE.format(q_part=q_part)
+
+
+# Скрытые стёкла во FREE считаем до этого порога, дальше пишем «N+»
+HIDDEN_COUNT_CAP = 10
+
+
+def _split_unique(items: Iterable[str], limit: int, rest_cap: int) -> Tuple[List[str], int]:
     """
-    True, если в строке брендов есть 'ОБЩИЕ' (регистронезависимо),
-    поддерживает список через запятую.
+    Первые limit уникальных значений (порядок сохраняется) и число остальных уникальных.
+    Остаток считается не дальше rest_cap + 1 — длинный список целиком не просматриваем.
     """
-    b = (brands or "").strip()
-    if not b:
-        return False
-    parts = [p.strip().lower() for p in b.split(",") if p.strip()]
-    return "общие" in parts
+    shown: List[str] = []
+    rest = 0
+    seen = set()
+    for item in items:
+        if item in seen:
+            continue
+        seen.add(item)
+        if len(shown) < limit:
+            shown.append(item)
+            continue
+        rest += 1
+        if rest > rest_cap:
+            break
+    return shown, rest
 
 
 def format_search_result(data: Dict[str, Any], *, is_premium: bool, free_glasses_limit: int = 3) -> str:
@@ -28,19 +57,12 @@ def format_search_result(data: Dict[str, Any], *, is_premium: bool, free_glasses
       - показывает все стекла
     """
     if not data.get("found"):
-        q = _safe(data.get("query"))
-        q_part = f"🔎 Запрос: <b>{q}</b>\n\n" if q else ""
-        return (
-            "❌ <b>Совпадений не найдено</b>\n\n"
-            f"{q_part}"
-            "Что можно сделать:\n"
-            "• попробуйте другое написание.\n"
-        )
+        return _format_not_found(data)
 
     results: List[Dict[str, Any]] = data.get("results") or []
 
     # На случай старого формата (один результат без results)
-    if not results:
+    if not results and ("group" in data or "matched_glass" in data):
         group = data.get("group") or {}
         results = [{
             "matched_glass": data.get("matched_glass", ""),
@@ -48,11 +70,17 @@ def format_search_result(data: Dict[str, Any], *, is_premium: bool, free_glasses
             "compatible_glasses": data.get("compatible_glasses", []),
         }]
 
+    # found, но показывать нечего — сразу ответ «не найдено», без сортировки
+    if not results:
+        return _format_not_found(data)
+
     # Сортировка: "ОБЩИЕ" всегда первыми
     def sort_key(item: Dict[str, Any]):
         group = item.get("group") or {}
-        brands = _safe(group.get("brands"))
-        is_common = _brands_has_common(brands)
+        is_common = group.get("brands_has_common")
+        if is_common is None:
+            # старый API без готового флага
+            is_common = brands_has_common(_safe(group.get("brands")))
         return (0 if is_common else 1,)
 
     results = sorted(results, key=sort_key)
@@ -61,11 +89,11 @@ def format_search_result(data: Dict[str, Any], *, is_premium: bool, free_glasses
     shown_groups = results[:max_groups]
     remainder_groups = max(0, len(results) - len(shown_groups))
 
-    blocks: List[str] = []
-    blocks.append("✅ <b>Взаимозаменяемость стекла</b>")
+    # Все строки ответа собираем в один список и склеиваем один раз в конце
+    lines: List[str] = ["✅ <b>Взаимозаменяемость стекла</b>"]
 
     if not is_premium:
-        blocks.append(
+        lines.append(
             "Чтобы видеть полный список подключите — /premium"
         )
 
@@ -75,50 +103,45 @@ def format_search_result(data: Dict[str, Any], *, is_premium: bool, free_glasses
         brands = _safe(group.get("brands"))
         description = _safe(group.get("description"))
 
-        glasses: List[str] = item.get("compatible_glasses") or []
-        glasses = [g.strip() for g in glasses if isinstance(g, str) and g.strip()]
-
-        # Уникализируем список стёкол
-        seen = set()
-        uniq: List[str] = []
-        for g in glasses:
-            if g not in seen:
-                seen.add(g)
-                uniq.append(g)
+        raw_glasses: List[Any] = item.get("compatible_glasses") or []
+        # очистка ленивая: во FREE список дальше лимита не просматривается
+        glasses = (g.strip() for g in raw_glasses if isinstance(g, str) and g.strip())
 
         if is_premium:
-            shown_items = uniq
+            # Уникализируем список стёкол (порядок сохраняется)
+            shown_items = list(dict.fromkeys(glasses))
             rest_items = 0
         else:
-            shown_items = uniq[:max(0, int(free_glasses_limit))]
-            rest_items = max(0, len(uniq) - len(shown_items))
-
-        lines = [f"• {g}" for g in shown_items] if shown_items else ["• (пусто)"]
+            # FREE: лимит + ограниченный счётчик скрытых
+            shown_items, rest_items = _split_unique(
+                glasses, max(0, int(free_glasses_limit)), HIDDEN_COUNT_CAP
+            )
 
-        if not is_premium and rest_items > 0:
-            lines.append(f"🔒 Ещё <b>{rest_items}</b> стекол скрыто.")
-
-        block = []
-        block.append(f"\n<b>Вариант {idx}</b>")
+        lines.append(f"\n<b>Вариант {idx}</b>")
         if matched:
-            block.append(f"🔖 Найдено: <b>{matched}</b>")
+            lines.append(f"🔖 Найдено: <b>{matched}</b>")
         if brands:
-            block.append(f"🏷 Бренд: <b>{brands}</b>")
+            lines.append(f"🏷 Бренд: <b>{brands}</b>")
         if description:
             desc = description
             if len(desc) > 300:
                 desc = desc[:297].rstrip() + "…"
-            block.append(f"📝 Описание: {desc}")
+            lines.append(f"📝 Описание: {desc}")
 
-        block.append("📌 <b>Подходящие стёкла:</b>")
-        block.extend(lines)
+        lines.append("📌 <b>Подходящие стёкла:</b>")
+        if shown_items:
+            lines.extend(f"• {g}" for g in shown_items)
+        else:
+            lines.append("• (пусто)")
 
-        blocks.append("\n".join(block))
+        if not is_premium and rest_items > 0:
+            rest_text = f"{HIDDEN_COUNT_CAP}+" if rest_items > HIDDEN_COUNT_CAP else str(rest_items)
+            lines.append(f"🔒 Ещё <b>{rest_text}</b> стекол скрыто.")
 
     if remainder_groups > 0:
-        blocks.append(
+        lines.append(
             f"\nℹ️ Показано <b>{len(shown_groups)}</b> из <b>{len(results)}</b>. "
             f"Ещё вариантов: <b>{remainder_groups}</b>. Уточните запрос, если нужно."
         )
 
-    return "\n".join(blocks).strip()
+    return "\n".join(lines).strip()
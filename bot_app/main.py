@@ -1,9 +1,16 @@
 # bot_app/main.py
 import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
 import os
 import secrets
+import struct
+import time
+from collections import OrderedDict
 from datetime import timedelta
-from typing import Any, Dict, Optional, Tuple, List
+from typing import Any, Awaitable, Callable, Coroutine, Dict, Final, Optional, Set, Tuple, List
 
 import django
 import httpx
@@ -23,6 +30,17 @@ from aiogram.types import (
     CallbackQuery,
 )
 
+# Ускорители (необязательные): быстрый JSON и event loop
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 from bot_app.settings import BOT_TOKEN, API_BASE_URL
 from bot_app.formatters import format_search_result
 
@@ -31,12 +49,12 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", os.getenv("DJANGO_SETTINGS_MODUL
 django.setup()
 
 from django.conf import settings  # noqa: E402
-from django.utils import timezone  # noqa: E402
+from django.utils.timezone import now as _now, localtime as _localtime  # noqa: E402
 from django.db import transaction  # noqa: E402
 from billing.models import TelegramUser, StarPayment, PremiumPlan  # noqa: E402
 
 # Analytics
-from analytics.services import log_event  # async wrapper
+from analytics.services import log_event, run_event_flusher, stop_event_flusher  # async, buffered
 from analytics.models import BotEvent  # for event type constants
 
 SEARCH_ENDPOINT = f"{API_BASE_URL}/api/search/"
@@ -61,77 +79,297 @@ MAIN_KB = ReplyKeyboardMarkup(
     input_field_placeholder="Введите модель или выберите действие…",
 )
 
+INFO_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📢 Канал (новости и обновления)", url=CHANNEL_URL)],
+    [InlineKeyboardButton(text="💬 Чат (вопросы и поддержка)", url=CHAT_URL)],
+])
+
+# Тексты экранов
+START_TEXT: Final[str] = (
+    "Отправьте модель/название стекла, и я покажу взаимозаменяемые варианты.\n\n"
+    "Кнопки:\n"
+    "• Статус — статус Premium\n"
+    "• Подписка — купить Premium (Stars)\n"
+    "• Информация — о боте и контакты\n\n"
+    "Команды:\n"
+    "/status — статус подписки\n"
+    "/premium — оформить Premium (Stars)"
+)
+
+HELP_TEXT: Final[str] = (
+    "Как пользоваться:\n"
+    "1) Напишите модель/название (можно алиас).\n"
+    "2) Я верну варианты взаимозаменяемости и список подходящих стёкол.\n\n"
+    "Кнопки:\n"
+    "• Статус — покажет активность Premium\n"
+    "• Подписка — оформить Premium (Stars)\n\n"
+    f"Текущий endpoint: {SEARCH_ENDPOINT}"
+)
+
+INFO_TEXT: Final[str] = (
+    "<b>ℹ️ О боте</b>\n\n"
+    "Бот помогает подобрать взаимозаменяемые защитные стёкла для телефонов.\n\n"
+
+    "<b>Зачем нужен Premium</b>\n\n"
+    "Premium — это поддержка проекта.\n"
+    "Подписка помогает оплачивать серверы, поддерживать базу данных, "
+    "выпускать обновления и развивать новые функции.\n\n"
+
+    "Что даёт Premium:\n"
+    "• Полный доступ ко всем результатам без ограничений\n"
+    "• Более удобную и подробную выдачу\n"
+    "• Быстрые обновления и улучшения\n\n"
+
+    "<b>Связь</b>\n\n"
+    "Подпишитесь на канал — там новости и новые проекты.\n"
+    "Если бот недоступен или есть вопросы — пишите в чат."
+)
+
+STATUS_INACTIVE_TEXT: Final[str] = "ℹ️ Premium не активен.\n\nОформить: /premium"
+PLANS_TEXT: Final[str] = "Выберите тариф Premium:"
+
 
 # -------------------------
 # HTTP
 # -------------------------
+# Один клиент на всё время работы бота: keep-alive вместо нового TCP/TLS на каждый запрос.
+# Создаётся в main(), закрывается при остановке.
+HTTP_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+def _make_http_client() -> httpx.AsyncClient:
+    # HTTP/2 (если API за TLS) — параллельные поиски мультиплексируются в одном соединении;
+    # retries=1 — повтор только неудачного соединения
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=1,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=60.0),
+    )
+    return httpx.AsyncClient(
+        base_url=API_BASE_URL,
+        timeout=httpx.Timeout(10.0, connect=5.0),
+        transport=transport,
+    )
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    # main() создаёт клиент заранее; лениво — если api_search вызвали в обход main()
+    global HTTP_CLIENT
+    if HTTP_CLIENT is None or HTTP_CLIENT.is_closed:
+        HTTP_CLIENT = _make_http_client()
+    return HTTP_CLIENT
+
+
+async def _fetch_search(query: str) -> Dict[str, Any]:
+    r = await _get_http_client().get("/api/search/", params={"q": query})
+    r.raise_for_status()
+    if orjson is not None:
+        return orjson.loads(r.content)
+    return r.json()
+
+
+# Недавние ответы поиска (результаты по модели за минуты не меняются)
+SEARCH_CACHE_TTL = 30.0  # секунд
+SEARCH_CACHE_MAX = 512
+
+_SEARCH_CACHE: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+# Запросы, которые уже летят в API: одинаковые параллельные поиски ждут один ответ.
+# None в результате — ведущий запрос отменён, ожидающие ищут сами
+_INFLIGHT: Dict[str, asyncio.Future] = {}
+
+
 async def api_search(query: str) -> Dict[str, Any]:
-    timeout = httpx.Timeout(10.0, connect=5.0)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        r = await client.get(SEARCH_ENDPOINT, params={"q": query})
-        r.raise_for_status()
-        return r.json()
+    hit = _SEARCH_CACHE.get(query)
+    if hit and hit[0] > time.monotonic():
+        _SEARCH_CACHE.move_to_end(query)
+        return hit[1]
+
+    fut = _INFLIGHT.get(query)
+    if fut is not None:
+        data = await asyncio.shield(fut)
+        if data is not None:
+            return data
+        return await api_search(query)
+
+    fut = asyncio.get_running_loop().create_future()
+    _INFLIGHT[query] = fut
+    try:
+        data = await _fetch_search(query)
+    except asyncio.CancelledError:
+        # общий future не отменяем: CancelledError ушёл бы чужим пользователям
+        fut.set_result(None)
+        raise
+    except Exception as e:
+        fut.set_exception(e)
+        fut.exception()  # ожидающих может не быть — не логируем "never retrieved"
+        raise
+    finally:
+        _INFLIGHT.pop(query, None)
+
+    fut.set_result(data)
+    _SEARCH_CACHE[query] = (time.monotonic() + SEARCH_CACHE_TTL, data)
+    _SEARCH_CACHE.move_to_end(query)
+    while len(_SEARCH_CACHE) > SEARCH_CACHE_MAX:
+        _SEARCH_CACHE.popitem(last=False)
+    return data
+
+
+# -------------------------
+# Background tasks
+# -------------------------
+# Ссылки на фоновые задачи, чтобы их не собрал GC; дожидаемся их при остановке
+_BG_TASKS: Set[asyncio.Task] = set()
+
+
+def _spawn(coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _BG_TASKS.add(task)
+    task.add_done_callback(_BG_TASKS.discard)
+    return task
 
 
 # -------------------------
 # Payload helpers
 # -------------------------
-def make_payload(user_id: int, plan_code: str) -> str:
-    nonce = secrets.token_urlsafe(8)
-    payload = f"p:{plan_code}:{user_id}:{nonce}"
-    return payload[:128]
+# Payload инвойса — фиксированная бинарная раскладка + подпись:
+#   версия(1) | PremiumPlan.pk(4) | user_id(8) | цена(4) | nonce(6) | HMAC-SHA256[:10]
+# 33 байта -> ровно 44 символа base64url, без "=". Цену можно проверить в precheckout без БД.
+# pk есть у любого тарифа из админки, а не только у кодов из PLAN_CODES_ORDER.
+_PAYLOAD_KEY = settings.SECRET_KEY.encode("utf-8")
+_PAYLOAD_STRUCT = struct.Struct("!BIQI6s")
+_PAYLOAD_VERSION = 2
+_PAYLOAD_SIG_LEN = 10
+_PAYLOAD_RAW_LEN = _PAYLOAD_STRUCT.size + _PAYLOAD_SIG_LEN
+
+
+def _payload_sig(raw: bytes) -> bytes:
+    return hmac.new(_PAYLOAD_KEY, raw, hashlib.sha256).digest()[:_PAYLOAD_SIG_LEN]
+
 
+def make_payload(user_id: int, plan_id: int, price: int) -> str:
+    raw = _PAYLOAD_STRUCT.pack(_PAYLOAD_VERSION, int(plan_id), user_id, int(price), secrets.token_bytes(6))
+    return "p" + base64.urlsafe_b64encode(raw + _payload_sig(raw)).decode("ascii")
 
-def parse_payload(payload: str) -> Optional[Tuple[str, int]]:
+
+def parse_payload(payload: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Возвращает (plan_id, user_id, price) или None, если формат/подпись неверны.
+    """
+    payload = payload or ""
+    if not payload.startswith("p"):
+        return None
     try:
-        parts = (payload or "").split(":")
-        if len(parts) < 4 or parts[0] != "p":
-            return None
-        plan_code = parts[1]
-        user_id = int(parts[2])
-        return plan_code, user_id
-    except Exception:
+        data = base64.urlsafe_b64decode(payload[1:])
+    except (ValueError, binascii.Error):
+        return None
+    if len(data) != _PAYLOAD_RAW_LEN:
         return None
 
+    raw, sig = data[:_PAYLOAD_STRUCT.size], data[_PAYLOAD_STRUCT.size:]
+    if not hmac.compare_digest(sig, _payload_sig(raw)):
+        return None
+
+    version, plan_id, user_id, price, _nonce = _PAYLOAD_STRUCT.unpack(raw)
+    if version != _PAYLOAD_VERSION:
+        return None
+    return plan_id, user_id, price
+
 
 # -------------------------
 # ORM wrappers (sync -> async)
 # -------------------------
-def _upsert_tg_user_sync(tg_id: int, username: str, first_name: str, last_name: str) -> TelegramUser:
+# колонки TelegramUser, которые читает бот
+_TG_USER_FIELDS: Final = ("telegram_id", "username", "first_name", "last_name", "premium_until")
+
+
+def _upsert_tg_user_db(tg_id: int, username: str, first_name: str, last_name: str) -> TelegramUser:
     defaults = {
         "username": username or "",
         "first_name": first_name or "",
         "last_name": last_name or "",
     }
 
-    obj, created = TelegramUser.objects.get_or_create(telegram_id=tg_id, defaults=defaults)
+    # поиск по уникальному индексу telegram_id; created_at/updated_at боту не нужны
+    obj, created = (
+        TelegramUser.objects
+        .only(*_TG_USER_FIELDS)
+        .get_or_create(telegram_id=tg_id, defaults=defaults)
+    )
     if not created:
-        changed = False
-        for k, v in defaults.items():
-            if getattr(obj, k) != v:
-                setattr(obj, k, v)
-                changed = True
+        changed = {k: v for k, v in defaults.items() if getattr(obj, k) != v}
         if changed:
-            obj.save(update_fields=["username", "first_name", "last_name", "updated_at"])
+            # точечный UPDATE только изменившихся колонок, без save() и сигналов
+            changed["updated_at"] = _now()
+            TelegramUser.objects.filter(pk=obj.pk).update(**changed)
+            for k, v in changed.items():
+                setattr(obj, k, v)
     return obj
 
 
+# Пользователь по чату: повторные сообщения в пределах TTL не ходят в БД
+# (premium_until берём отсюда же — устаревание не больше TTL)
+TG_USER_CACHE_TTL = 30.0  # секунд
+TG_USER_CACHE_MAX = 4096
+
+_TG_USER_CACHE: "OrderedDict[int, Tuple[float, TelegramUser]]" = OrderedDict()
+
+
+def _upsert_tg_user_sync(tg_id: int, username: str, first_name: str, last_name: str) -> TelegramUser:
+    hit = _TG_USER_CACHE.get(tg_id)
+    if hit and hit[0] > time.monotonic():
+        user = hit[1]
+        # профиль в Telegram не менялся — UPDATE не нужен
+        if (user.username, user.first_name, user.last_name) == (username or "", first_name or "", last_name or ""):
+            _TG_USER_CACHE.move_to_end(tg_id)
+            return user
+
+    user = _upsert_tg_user_db(tg_id, username, first_name, last_name)
+    _TG_USER_CACHE[tg_id] = (time.monotonic() + TG_USER_CACHE_TTL, user)
+    _TG_USER_CACHE.move_to_end(tg_id)
+    while len(_TG_USER_CACHE) > TG_USER_CACHE_MAX:
+        _TG_USER_CACHE.popitem(last=False)
+    return user
+
+
 # async wrapper to use in handlers
 upsert_tg_user = sync_to_async(_upsert_tg_user_sync, thread_sensitive=True)
 
 
-def _is_premium_active_sync(tg_id: int) -> Tuple[bool, Optional[Any]]:
-    user = TelegramUser.objects.filter(telegram_id=tg_id).first()
-    if not user or not user.premium_until:
-        return False, None
-    return user.premium_until > timezone.now(), user.premium_until
+def _handle_text_prelude_sync(tg_id: int, username: str, first_name: str, last_name: str) -> Tuple[TelegramUser, bool]:
+    """
+    upsert пользователя + проверка Premium за один заход в sync-поток.
+    Возвращает (user, premium_active).
+    """
+    user = _upsert_tg_user_sync(tg_id, username, first_name, last_name)
+    premium_until = user.premium_until
+    active = bool(premium_until and premium_until > _now())
+    return user, active
 
 
-is_premium_active = sync_to_async(_is_premium_active_sync, thread_sensitive=True)
+handle_text_prelude = sync_to_async(_handle_text_prelude_sync, thread_sensitive=True)
 
 
-def _get_plan_sync(plan_code: str) -> PremiumPlan:
+# Тарифы меняются редко (только через админку) — держим их в памяти процесса
+PLANS_CACHE_TTL = 60.0  # секунд
+
+_PLANS_CACHE: Dict[str, Tuple[float, PremiumPlan]] = {}
+_PLANS_LIST_CACHE: Tuple[float, List[PremiumPlan]] = (0.0, [])
+
+
+def _get_plan_cached_sync(plan_code: str) -> Optional[PremiumPlan]:
+    """Активный тариф из кэша (в БД идём только при промахе). None — тарифа нет."""
+    cached = _PLANS_CACHE.get(plan_code)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
     plan = PremiumPlan.objects.filter(code=plan_code, is_active=True).first()
+    if plan:
+        _PLANS_CACHE[plan_code] = (time.monotonic() + PLANS_CACHE_TTL, plan)
+    return plan
+
+
+def _get_plan_sync(plan_code: str) -> PremiumPlan:
+    plan = _get_plan_cached_sync(plan_code)
     if not plan:
         raise RuntimeError(f"Premium plan '{plan_code}' not found or inactive. Create it in admin.")
     return plan
@@ -141,16 +379,27 @@ get_plan = sync_to_async(_get_plan_sync, thread_sensitive=True)
 
 
 def _list_plans_sync() -> List[PremiumPlan]:
+    global _PLANS_LIST_CACHE
+
+    expires_at, cached = _PLANS_LIST_CACHE
+    if expires_at > time.monotonic():
+        return cached
+
     qs = PremiumPlan.objects.filter(is_active=True, code__in=PLAN_CODES_ORDER)
     by_code = {p.code: p for p in qs}
     ordered = [by_code[c] for c in PLAN_CODES_ORDER if c in by_code]
+
+    now = time.monotonic()
+    _PLANS_LIST_CACHE = (now + PLANS_CACHE_TTL, ordered)
+    for p in ordered:
+        _PLANS_CACHE[p.code] = (now + PLANS_CACHE_TTL, p)
     return ordered
 
 
 list_plans = sync_to_async(_list_plans_sync, thread_sensitive=True)
 
 
-def _precheckout_validate_sync(from_user_id: int, currency: str, total_amount: int, payload: str) -> Tuple[bool, str]:
+async def precheckout_validate(from_user_id: int, currency: str, total_amount: int, payload: str) -> Tuple[bool, str]:
     if currency != "XTR":
         return False, "Неверная валюта платежа."
 
@@ -158,24 +407,74 @@ def _precheckout_validate_sync(from_user_id: int, currency: str, total_amount: i
     if not parsed:
         return False, "Некорректный payload платежа."
 
-    plan_code, uid = parsed
+    _plan_id, uid, price = parsed
     if uid != from_user_id:
         return False, "Платёж не соответствует пользователю."
 
-    plan = PremiumPlan.objects.filter(code=plan_code, is_active=True).first()
-    if not plan:
-        return False, "Тариф недоступен."
-
-    if int(total_amount) != int(plan.price_stars):
+    # окно precheckout короткое — цена берётся из подписанного payload, без БД;
+    # при зачислении сумма сверяется с той же подписанной ценой
+    if int(total_amount) != price:
         return False, "Неверная сумма платежа."
 
     return True, ""
 
 
-precheckout_validate = sync_to_async(_precheckout_validate_sync, thread_sensitive=True)
+def _apply_success_payment_sync(
+    plan_id: int,
+    tg_id: int,
+    username: str,
+    first_name: str,
+    last_name: str,
+    currency: str,
+    total_amount: int,
+    invoice_payload: str,
+    telegram_payment_charge_id: str,
+    provider_payment_charge_id: str,
+) -> Tuple[bool, str, Optional[Any]]:
+    """
+    Транзакционная часть зачисления оплаты (платёж уже провалидирован).
+    Возвращает (ok, msg, premium_until).
+    """
+    # premium_until меняется — кэш пользователя сбрасываем, строку читаем из БД
+    _TG_USER_CACHE.pop(tg_id, None)
+    with transaction.atomic():
+        # тариф из подписанного payload; без фильтра is_active — оплата уже списана,
+        # даже если тариф успели выключить после отправки инвойса
+        plan = PremiumPlan.objects.filter(pk=plan_id).first()
+        if not plan:
+            return False, "Платёж получен, но тариф не найден.", None
 
+        user = _upsert_tg_user_db(tg_id, username, first_name, last_name)
 
-def _apply_success_payment_sync(
+        # идемпотентность: telegram_payment_charge_id уникален на уровне БД
+        _sp, created = StarPayment.objects.get_or_create(
+            telegram_payment_charge_id=telegram_payment_charge_id,
+            defaults={
+                "user": user,
+                "provider_payment_charge_id": provider_payment_charge_id or "",
+                "currency": currency,
+                "total_amount": int(total_amount),
+                "invoice_payload": invoice_payload,
+                "status": StarPayment.STATUS_SUCCEEDED,
+            },
+        )
+        if not created:
+            return False, "Платёж уже был обработан.", user.premium_until
+
+        now = _now()
+        base = user.premium_until if user.premium_until and user.premium_until > now else now
+        new_until = base + timedelta(days=int(plan.duration_days))
+        # один UPDATE двух колонок, без save()
+        TelegramUser.objects.filter(pk=user.pk).update(premium_until=new_until, updated_at=now)
+        user.premium_until = new_until
+
+    return True, "✅ Оплата получена. Premium активирован.", user.premium_until
+
+
+_apply_success_payment_tx = sync_to_async(_apply_success_payment_sync, thread_sensitive=True)
+
+
+async def apply_success_payment(
     tg_id: int,
     username: str,
     first_name: str,
@@ -197,44 +496,28 @@ def _apply_success_payment_sync(
     if not parsed:
         return False, "Платёж получен, но тариф не распознан.", None
 
-    plan_code, uid = parsed
+    plan_id, uid, price = parsed
     if uid != tg_id:
         return False, "Платёж получен, но пользователь не совпадает.", None
 
-    plan = PremiumPlan.objects.filter(code=plan_code, is_active=True).first()
-    if not plan:
-        return False, "Платёж получен, но тариф сейчас недоступен.", None
-
-    if int(total_amount) != int(plan.price_stars):
+    # сверяем с ценой из подписанного payload (её же проверил precheckout),
+    # а не с текущей ценой тарифа: её могли изменить после отправки инвойса
+    if int(total_amount) != price:
         return False, "Платёж получен, но сумма не совпала с тарифом.", None
 
-    # идемпотентность
-    if StarPayment.objects.filter(telegram_payment_charge_id=telegram_payment_charge_id).exists():
-        user = TelegramUser.objects.filter(telegram_id=tg_id).first()
-        return False, "Платёж уже был обработан.", user.premium_until if user else None
-
-    with transaction.atomic():
-        user = _upsert_tg_user_sync(tg_id, username, first_name, last_name)
-
-        StarPayment.objects.create(
-            user=user,
-            telegram_payment_charge_id=telegram_payment_charge_id,
-            provider_payment_charge_id=provider_payment_charge_id or "",
-            currency=currency,
-            total_amount=int(total_amount),
-            invoice_payload=invoice_payload,
-            status=StarPayment.STATUS_SUCCEEDED,
-        )
-
-        now = timezone.now()
-        base = user.premium_until if user.premium_until and user.premium_until > now else now
-        user.premium_until = base + timedelta(days=int(plan.duration_days))
-        user.save(update_fields=["premium_until", "updated_at"])
-
-    return True, "✅ Оплата получена. Premium активирован.", user.premium_until
-
-
-apply_success_payment = sync_to_async(_apply_success_payment_sync, thread_sensitive=True)
+    # async-транзакций в Django нет — запись делаем одним заходом в sync-поток
+    return await _apply_success_payment_tx(
+        plan_id,
+        tg_id,
+        username,
+        first_name,
+        last_name,
+        currency,
+        total_amount,
+        invoice_payload,
+        telegram_payment_charge_id,
+        provider_payment_charge_id,
+    )
 
 
 # -------------------------
@@ -245,43 +528,66 @@ def split_html_message(text: str, max_len: int = TG_MAX_MESSAGE) -> List[str]:
         return [text]
 
     marker = "\n<b>Вариант "
+
+    # 1) режем по вариантам: один проход find(), куски копим списком
     chunks: List[str] = []
-    parts = text.split(marker)
+    bucket: List[str] = []
+    bucket_len = 0
+    # кусок длиннее max_len может получиться только из одного варианта
+    over_any = False
+
+    start = 0
+    nxt = text.find(marker)
+    while True:
+        end = nxt if nxt >= 0 else len(text)
+        piece = text[start:end].strip()
+        start = end
+
+        if piece:
+            over_any = over_any or len(piece) > max_len
+            if not bucket:
+                bucket.append(piece)
+                bucket_len = len(piece)
+            elif bucket_len + 2 + len(piece) <= max_len:
+                bucket.append(piece)
+                bucket_len += 2 + len(piece)
+            else:
+                chunks.append("\n\n".join(bucket))
+                bucket = [piece]
+                bucket_len = len(piece)
 
-    current = parts[0].strip()
-    for i in range(1, len(parts)):
-        piece = (marker + parts[i]).strip()
-        if not current:
-            current = piece
-            continue
+        if nxt < 0:
+            break
+        nxt = text.find(marker, start + 1)
 
-        if len(current) + 2 + len(piece) <= max_len:
-            current += "\n\n" + piece
-        else:
-            chunks.append(current)
-            current = piece
+    if bucket:
+        chunks.append("\n\n".join(bucket))
 
-    if current:
-        chunks.append(current)
+    if not over_any:
+        return chunks
 
+    # 2) слишком длинные куски режем по строкам
     final: List[str] = []
     for ch in chunks:
         if len(ch) <= max_len:
             final.append(ch)
             continue
 
-        lines = ch.split("\n")
-        cur = ""
-        for ln in lines:
-            add = ln + "\n"
-            if len(cur) + len(add) <= max_len:
-                cur += add
-            else:
-                if cur.strip():
-                    final.append(cur.strip())
-                cur = add
-        if cur.strip():
-            final.append(cur.strip())
+        lines: List[str] = []
+        cur_len = 0
+        for ln in ch.split("\n"):
+            add_len = len(ln) + 1
+            if cur_len + add_len > max_len:
+                cur = "\n".join(lines).strip()
+                if cur:
+                    final.append(cur)
+                lines = []
+                cur_len = 0
+            lines.append(ln)
+            cur_len += add_len
+        cur = "\n".join(lines).strip()
+        if cur:
+            final.append(cur)
 
     return final
 
@@ -294,33 +600,43 @@ async def send_long_html(message: Message, text: str) -> None:
 # -------------------------
 # UI: plans keyboard
 # -------------------------
+# Клавиатура тарифов живёт столько же, сколько кэш тарифов
+_PLANS_KB_CACHE: Optional[Tuple[float, InlineKeyboardMarkup]] = None
+
+
 async def build_plans_kb() -> InlineKeyboardMarkup:
+    global _PLANS_KB_CACHE
+
+    if _PLANS_KB_CACHE and _PLANS_KB_CACHE[0] > time.monotonic():
+        return _PLANS_KB_CACHE[1]
+
     plans = await list_plans()
     rows: List[List[InlineKeyboardButton]] = []
     for p in plans:
         btn_text = f"{p.duration_days} дней — {p.price_stars} ⭐"
         rows.append([InlineKeyboardButton(text=btn_text, callback_data=f"buy:{p.code}")])
-    return InlineKeyboardMarkup(inline_keyboard=rows)
+    kb = InlineKeyboardMarkup(inline_keyboard=rows)
+    _PLANS_KB_CACHE = (time.monotonic() + PLANS_CACHE_TTL, kb)
+    return kb
+
+
+async def _log_invoice_sent(tg: Any, plan_code: str, price: int) -> None:
+    try:
+        user_obj = await upsert_tg_user(tg.id, tg.username or "", tg.first_name or "", tg.last_name or "")
+        await log_event(user_obj, BotEvent.EventType.INVOICE_SENT, {"plan_code": plan_code, "price": price})
+    except Exception:
+        pass
 
 
 async def send_invoice_for_plan(message: Message, plan_code: str) -> None:
     tg = message.from_user
     plan = await get_plan(plan_code)
 
-    payload = make_payload(tg.id, plan.code)
+    payload = make_payload(tg.id, plan.pk, plan.price_stars)
     prices = [LabeledPrice(label=plan.title, amount=int(plan.price_stars))]
 
-    # Log invoice sent (analytics)
-    try:
-        user_obj = await upsert_tg_user(tg.id, tg.username or "", tg.first_name or "", tg.last_name or "")
-    except Exception:
-        user_obj = None
-
-    if user_obj:
-        try:
-            await log_event(user_obj, BotEvent.EventType.INVOICE_SENT, {"plan_code": plan.code, "price": plan.price_stars})
-        except Exception:
-            pass
+    # Log invoice sent (analytics) — в фоне, инвойс не ждёт записи пользователя
+    _spawn(_log_invoice_sent(tg, plan.code, plan.price_stars))
 
     await message.answer_invoice(
         title=plan.title,
@@ -337,123 +653,61 @@ async def send_invoice_for_plan(message: Message, plan_code: str) -> None:
 # -------------------------
 async def cmd_start(message: Message) -> None:
     tg = message.from_user
-    await upsert_tg_user(tg.id, tg.username or "", tg.first_name or "", tg.last_name or "")
-    try:
-        user = TelegramUser.objects.filter(telegram_id=tg.id).first()
-        if user:
-            await log_event(user, BotEvent.EventType.START)
-    except Exception:
-        pass
+    user = await upsert_tg_user(tg.id, tg.username or "", tg.first_name or "", tg.last_name or "")
+    await log_event(user, BotEvent.EventType.START)
 
-    await message.answer(
-        "Отправьте модель/название стекла, и я покажу взаимозаменяемые варианты.\n\n"
-        "Кнопки:\n"
-        "• Статус — статус Premium\n"
-        "• Подписка — купить Premium (Stars)\n"
-        "• Информация — о боте и контакты\n\n"
-        "Команды:\n"
-        "/status — статус подписки\n"
-        "/premium — оформить Premium (Stars)",
-        reply_markup=MAIN_KB,
-    )
+    await message.answer(START_TEXT, reply_markup=MAIN_KB)
 
 
 async def cmd_help(message: Message) -> None:
     tg = message.from_user
-    await upsert_tg_user(tg.id, tg.username or "", tg.first_name or "", tg.last_name or "")
-    try:
-        user = TelegramUser.objects.filter(telegram_id=tg.id).first()
-        if user:
-            await log_event(user, BotEvent.EventType.HELP)
-    except Exception:
-        pass
+    user = await upsert_tg_user(tg.id, tg.username or "", tg.first_name or "", tg.last_name or "")
+    await log_event(user, BotEvent.EventType.HELP)
 
-    await message.answer(
-        "Как пользоваться:\n"
-        "1) Напишите модель/название (можно алиас).\n"
-        "2) Я верну варианты взаимозаменяемости и список подходящих стёкол.\n\n"
-        "Кнопки:\n"
-        "• Статус — покажет активность Premium\n"
-        "• Подписка — оформить Premium (Stars)\n\n"
-        f"Текущий endpoint: {SEARCH_ENDPOINT}",
-        reply_markup=MAIN_KB,
-    )
+    await message.answer(HELP_TEXT, reply_markup=MAIN_KB)
 
 
 async def cmd_status(message: Message) -> None:
     tg = message.from_user
-    await upsert_tg_user(tg.id, tg.username or "", tg.first_name or "", tg.last_name or "")
+    user, active = await handle_text_prelude(tg.id, tg.username or "", tg.first_name or "", tg.last_name or "")
 
-    active, until = await is_premium_active(tg.id)
+    until = user.premium_until
     if active and until:
-        dt = timezone.localtime(until).strftime("%Y-%m-%d %H:%M")
+        dt = _localtime(until).strftime("%Y-%m-%d %H:%M")
         await message.answer(f"✅ Premium активен до: <b>{dt}</b>", reply_markup=MAIN_KB)
     else:
-        await message.answer("ℹ️ Premium не активен.\n\nОформить: /premium", reply_markup=MAIN_KB)
+        await message.answer(STATUS_INACTIVE_TEXT, reply_markup=MAIN_KB)
 
 
 async def cmd_premium(message: Message) -> None:
     tg = message.from_user
-    await upsert_tg_user(tg.id, tg.username or "", tg.first_name or "", tg.last_name or "")
+    user = await upsert_tg_user(tg.id, tg.username or "", tg.first_name or "", tg.last_name or "")
 
     kb = await build_plans_kb()
-    try:
-        user = TelegramUser.objects.filter(telegram_id=tg.id).first()
-        if user:
-            await log_event(user, BotEvent.EventType.PREMIUM_OPEN)
-    except Exception:
-        pass
+    await log_event(user, BotEvent.EventType.PREMIUM_OPEN)
 
-    await message.answer("Выберите тариф Premium:", reply_markup=kb)
+    await message.answer(PLANS_TEXT, reply_markup=kb)
 
 
 async def cmd_info(message: Message) -> None:
     tg = message.from_user
-    await upsert_tg_user(tg.id, tg.username or "", tg.first_name or "", tg.last_name or "")
-
-    try:
-        user = TelegramUser.objects.filter(telegram_id=tg.id).first()
-        if user:
-            await log_event(user, BotEvent.EventType.INFO)
-    except Exception:
-        pass
-
-    text = (
-        "<b>ℹ️ О боте</b>\n\n"
-        "Бот помогает подобрать взаимозаменяемые защитные стёкла для телефонов.\n\n"
-
-        "<b>Зачем нужен Premium</b>\n\n"
-        "Premium — это поддержка проекта.\n"
-        "Подписка помогает оплачивать серверы, поддерживать базу данных, "
-        "выпускать обновления и развивать новые функции.\n\n"
-
-        "Что даёт Premium:\n"
-        "• Полный доступ ко всем результатам без ограничений\n"
-        "• Более удобную и подробную выдачу\n"
-        "• Быстрые обновления и улучшения\n\n"
+    user = await upsert_tg_user(tg.id, tg.username or "", tg.first_name or "", tg.last_name or "")
 
-        "<b>Связь</b>\n\n"
-        "Подпишитесь на канал — там новости и новые проекты.\n"
-        "Если бот недоступен или есть вопросы — пишите в чат."
-    )
-
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📢 Канал (новости и обновления)", url=CHANNEL_URL)],
-        [InlineKeyboardButton(text="💬 Чат (вопросы и поддержка)", url=CHAT_URL)],
-    ])
+    await log_event(user, BotEvent.EventType.INFO)
 
-    await message.answer(text, reply_markup=kb)
+    await message.answer(INFO_TEXT, reply_markup=INFO_KB)
 
 
-# Reply keyboard wrappers (register these, not lambdas)
-async def btn_status(message: Message) -> None:
-    await cmd_status(message)
+# Reply keyboard: текст кнопки -> обработчик (один фильтр вместо трёх)
+BUTTON_DISPATCH: Dict[str, Callable[[Message], Awaitable[None]]] = {
+    "Статус": cmd_status,
+    "Подписка": cmd_premium,
+    "Информация": cmd_info,
+}
 
-async def btn_premium(message: Message) -> None:
-    await cmd_premium(message)
 
-async def btn_info(message: Message) -> None:
-    await cmd_info(message)
+async def on_button(message: Message) -> None:
+    await BUTTON_DISPATCH[message.text](message)
 
 
 # -------------------------
@@ -465,7 +719,7 @@ async def on_buy_callback(callback: CallbackQuery) -> None:
         await callback.answer()
         return
 
-    plan_code = data.split("buy:", 1)[1].strip()
+    plan_code = data[4:].strip()  # срез после "buy:" без промежуточного списка
     await callback.answer()  # убираем "часики"
 
     if not callback.message:
@@ -509,7 +763,7 @@ async def successful_payment_handler(message: Message) -> None:
     )
 
     if ok and until:
-        dt = timezone.localtime(until).strftime("%Y-%m-%d %H:%M")
+        dt = _localtime(until).strftime("%Y-%m-%d %H:%M")
         await message.answer(f"{msg} До: <b>{dt}</b>", reply_markup=MAIN_KB)
     else:
         await message.answer(msg, reply_markup=MAIN_KB)
@@ -520,32 +774,24 @@ async def successful_payment_handler(message: Message) -> None:
 # Main text handler
 # -------------------------
 async def handle_text(message: Message) -> None:
-    tg = message.from_user
-    await upsert_tg_user(tg.id, tg.username or "", tg.first_name or "", tg.last_name or "")
-
     q = (message.text or "").strip()
     if not q:
         return
 
-    if q == "Статус":
-        await cmd_status(message)
-        return
-    if q == "Подписка":
-        await cmd_premium(message)
-        return
-    if q == "Информация":
-        await cmd_info(message)
-        return
+    tg = message.from_user
 
+    # запрос в API поиска идёт параллельно с upsert пользователя в БД
+    search = asyncio.create_task(api_search(q))
     try:
-        user = TelegramUser.objects.filter(telegram_id=tg.id).first()
-        if user:
-            await log_event(user, BotEvent.EventType.SEARCH, {"query": q})
-    except Exception:
-        pass
+        user, active = await handle_text_prelude(tg.id, tg.username or "", tg.first_name or "", tg.last_name or "")
+    except BaseException:
+        search.cancel()
+        raise
+
+    await log_event(user, BotEvent.EventType.SEARCH, {"query": q})
 
     try:
-        data = await api_search(q)
+        data = await search
     except httpx.HTTPStatusError as e:
         await message.answer(
             "Ошибка ответа от сервера поиска.\n"
@@ -565,22 +811,15 @@ async def handle_text(message: Message) -> None:
         await message.answer("Неожиданная ошибка при поиске.", reply_markup=MAIN_KB)
         return
 
-    try:
-        user = TelegramUser.objects.filter(telegram_id=tg.id).first()
-        if user:
-            await log_event(
-                user,
-                BotEvent.EventType.SEARCH_RESULT,
-                {
-                    "query": q,
-                    "found": data.get("found"),
-                    "results_count": len(data.get("results", [])) if isinstance(data.get("results", []), list) else 0,
-                },
-            )
-    except Exception:
-        pass
-
-    active, _until = await is_premium_active(tg.id)
+    await log_event(
+        user,
+        BotEvent.EventType.SEARCH_RESULT,
+        {
+            "query": q,
+            "found": data.get("found"),
+            "results_count": len(data.get("results", [])) if isinstance(data.get("results", []), list) else 0,
+        },
+    )
 
     text = format_search_result(
         data,
@@ -591,6 +830,8 @@ async def handle_text(message: Message) -> None:
 
 
 async def main() -> None:
+    global HTTP_CLIENT
+
     bot = Bot(
         token=BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
@@ -604,10 +845,8 @@ async def main() -> None:
     dp.message.register(cmd_premium, Command("premium"))
     dp.message.register(cmd_info, Command("info"))
 
-    # Reply keyboard buttons (register wrapper handlers)
-    dp.message.register(btn_status, F.text == "Статус")
-    dp.message.register(btn_premium, F.text == "Подписка")
-    dp.message.register(btn_info, F.text == "Информация")
+    # Reply keyboard buttons
+    dp.message.register(on_button, F.text.in_(BUTTON_DISPATCH.keys()))
 
     # Inline callbacks for plan choice
     dp.callback_query.register(on_buy_callback, F.data.startswith("buy:"))
@@ -619,8 +858,23 @@ async def main() -> None:
     # Search / default text
     dp.message.register(handle_text, F.text)
 
-    await dp.start_polling(bot)
+    HTTP_CLIENT = _make_http_client()
+
+    # Аналитика пишется пачками в фоне
+    flusher = asyncio.create_task(run_event_flusher())
+    try:
+        await dp.start_polling(bot)
+    finally:
+        if _BG_TASKS:
+            await asyncio.gather(*_BG_TASKS, return_exceptions=True)
+        # не cancel(): пачка, которую flusher уже забрал из очереди, должна дописаться
+        await stop_event_flusher(flusher)
+        if HTTP_CLIENT is not None:
+            await HTTP_CLIENT.aclose()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
@@ -1,86 +1,70 @@
 import csv
 import re
-from io import BytesIO, TextIOWrapper
+from functools import lru_cache
+from io import BytesIO, StringIO, TextIOWrapper
+from itertools import islice
 
 from django.contrib import admin, messages
-from django.db import transaction
-from django.http import HttpRequest, HttpResponse
+from django.db import connection, transaction
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.urls import path
 from django.utils import timezone
 
 from openpyxl import Workbook, load_workbook
 
+from shared.brands import brands_has_common
+
+from .cache import bump_catalog_version
 from .models import GlassGroup, Glass, GlassAlias
 
 
 # ---------------------------
 # Utilities
 # ---------------------------
+# чистая функция над str: при импорте одни и те же строки (бренды, модели, алиасы) повторяются
+@lru_cache(maxsize=100_000)
 def _normalize(s: str) -> str:
     return " ".join((s or "").strip().lower().split())
 
 
-def _split_aliases(raw: str) -> list[str]:
-    raw = raw or ""
-    parts: list[str] = []
-    for chunk in raw.replace("|", ";").replace(",", ";").split(";"):
-        v = chunk.strip()
-        if v:
-            parts.append(v)
-    return parts
-
-
-def sync_glass_aliases(glass: Glass) -> None:
-    parts = _split_aliases(glass.aliases_text or "")
+_MODELS_SPLIT_RE = re.compile(r"[\/\n]+")
 
-    desired_norm_to_original: dict[str, str] = {}
-    for p in parts:
-        n = _normalize(p)
-        if n:
-            desired_norm_to_original[n] = p
 
-    existing = list(GlassAlias.objects.filter(glass=glass))
-    existing_norm_to_obj = {_normalize(a.alias): a for a in existing}
+def _unique_by_normalized(items: list[str]) -> list[str]:
+    """Убирает дубли по _normalize (порядок и написание — по первому вхождению)."""
+    first: dict[str, str] = {}
+    for v in items:
+        first.setdefault(_normalize(v), v)
+    return list(first.values())
 
-    for norm, obj in existing_norm_to_obj.items():
-        if norm not in desired_norm_to_original:
-            obj.delete()
 
-    for norm, original in desired_norm_to_original.items():
-        if norm not in existing_norm_to_obj:
-            GlassAlias.objects.create(glass=glass, alias=original)
+def _clear_catalog() -> None:
+    """
+    Полная очистка каталога: по одному DELETE на таблицу (алиасы -> стёкла -> группы).
+    ORM .delete() из-за сигналов post_delete грузил бы в Python каждую строку.
+    """
+    with connection.cursor() as cursor:
+        for model in (GlassAlias, Glass, GlassGroup):
+            cursor.execute(f"DELETE FROM {connection.ops.quote_name(model._meta.db_table)}")
+    # сигналы не сработали — кэш поиска сбрасываем явно
+    bump_catalog_version()
 
 
 def _append_brand_list(raw_brand_cell: str) -> str:
     raw = (raw_brand_cell or "").strip()
     if not raw:
         return ""
-    parts = [p.strip() for p in raw.split(",") if p.strip()]
-    seen = set()
-    out: list[str] = []
-    for p in parts:
-        b = p.upper()
-        nb = _normalize(b)
-        if nb and nb not in seen:
-            seen.add(nb)
-            out.append(b)
-    return ", ".join(out)
+    brands = [p.upper() for p in map(str.strip, raw.split(",")) if p]
+    return ", ".join(_unique_by_normalized(brands))
 
 
 def _parse_models_cell(raw_models: str) -> list[str]:
     raw = (raw_models or "").strip()
     if not raw:
         return []
-    models = [x.strip() for x in re.split(r"[\/\n]+", raw) if x and x.strip()]
-    seen = set()
-    uniq: list[str] = []
-    for m in models:
-        nm = _normalize(m)
-        if nm and nm not in seen:
-            seen.add(nm)
-            uniq.append(m)
-    return uniq
+    models = [m for m in map(str.strip, _MODELS_SPLIT_RE.split(raw)) if m]
+    return _unique_by_normalized(models)
 
 
 def _find_columns_by_header(header_row: list[str | None]) -> tuple[int, int, int]:
@@ -108,6 +92,36 @@ def _find_columns_by_header(header_row: list[str | None]) -> tuple[int, int, int
     return id_idx, brand_idx, models_idx
 
 
+# Импорт XLSX: сколько объектов пишем в одной транзакции
+IMPORT_BATCH_SIZE = 1000
+
+
+def _batched(items: list, size: int = IMPORT_BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# Экспорт: стёкла группы уже отсортированы prefetch-запросом, группы читаются пачками
+EXPORT_CHUNK_SIZE = 200
+
+
+def _iter_by_name(queryset, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Группы пачками по уникальному name: WHERE name > последнее ORDER BY name LIMIT n.
+    В отличие от iterator() не нужен серверный курсор — работает и за PgBouncer
+    (DISABLE_SERVER_SIDE_CURSORS). prefetch_related выполняется на каждую пачку.
+    """
+    queryset = queryset.order_by("name")
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(name__gt=last)
+        batch = list(page[:chunk_size])
+        yield from batch
+        if len(batch) < chunk_size:
+            return
+        last = batch[-1].name
+
+
 # ---------------------------
 # Admin Inlines
 # ---------------------------
@@ -135,49 +149,55 @@ class GlassGroupAdmin(admin.ModelAdmin):
     actions = ("export_groups_csv", "export_groups_xlsx")
     change_list_template = "admin/catalog/glassgroup/change_list.html"
 
-    @transaction.atomic
-    def save_formset(self, request, form, formset, change):
-        instances = formset.save()
-        for obj in instances:
-            if isinstance(obj, Glass):
-                sync_glass_aliases(obj)
-
     # ---------- export CSV ----------
     @admin.action(description="Экспорт выбранных групп в CSV")
     def export_groups_csv(self, request: HttpRequest, queryset):
-        queryset = queryset.prefetch_related("glasses").order_by("name")
+        queryset = queryset.with_catalog()
         ts = timezone.now().strftime("%Y%m%d_%H%M%S")
         filename = f"glass_groups_{ts}.csv"
 
-        response = HttpResponse(content_type="text/csv; charset=utf-8")
+        def rows():
+            buffer = StringIO()
+            writer = csv.writer(buffer)
+            buffer.write("\ufeff")
+            writer.writerow(["excel_id", "group_name", "group_brands", "group_description", "glass_name", "glass_aliases_text"])
+
+            def lines():
+                for group in _iter_by_name(queryset):
+                    glasses = group.glasses.all()
+                    if not glasses:
+                        yield [group.external_id, group.name, group.brands or "", group.description or "", "", ""]
+                        continue
+                    for glass in glasses:
+                        yield [group.external_id, group.name, group.brands or "", group.description or "", glass.name, glass.aliases_text or ""]
+
+            # отдаём клиенту по EXPORT_CHUNK_SIZE строк, не держа весь файл в памяти
+            it = lines()
+            while True:
+                writer.writerows(islice(it, EXPORT_CHUNK_SIZE))
+                chunk = buffer.getvalue()
+                if not chunk:
+                    return
+                yield chunk
+                buffer.seek(0)
+                buffer.truncate(0)
+
+        response = StreamingHttpResponse(rows(), content_type="text/csv; charset=utf-8")
         response["Content-Disposition"] = f'attachment; filename="{filename}"'
-        response.write("\ufeff")
-
-        writer = csv.writer(response)
-        writer.writerow(["excel_id", "group_name", "group_brands", "group_description", "glass_name", "glass_aliases_text"])
-
-        for group in queryset:
-            glasses = list(group.glasses.all().order_by("name"))
-            if not glasses:
-                writer.writerow([group.external_id, group.name, group.brands or "", group.description or "", "", ""])
-                continue
-            for glass in glasses:
-                writer.writerow([group.external_id, group.name, group.brands or "", group.description or "", glass.name, glass.aliases_text or ""])
-
         return response
 
     # ---------- export XLSX ----------
     @admin.action(description="Экспорт выбранных групп в Excel (XLSX)")
     def export_groups_xlsx(self, request: HttpRequest, queryset):
-        queryset = queryset.prefetch_related("glasses").order_by("name")
+        queryset = queryset.with_catalog()
 
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Glass Groups"
+        # write_only: строки сбрасываются в файл по мере добавления, без объектов Cell
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Glass Groups")
         ws.append(["excel_id", "group_name", "group_brands", "group_description", "glass_name", "glass_aliases_text"])
 
-        for group in queryset:
-            glasses = list(group.glasses.all().order_by("name"))
+        for group in _iter_by_name(queryset):
+            glasses = group.glasses.all()
             if not glasses:
                 ws.append([group.external_id, group.name, group.brands or "", group.description or "", "", ""])
                 continue
@@ -218,9 +238,7 @@ class GlassGroupAdmin(admin.ModelAdmin):
 
             clear = bool(request.POST.get("clear_before_import"))
             if clear:
-                GlassAlias.objects.all().delete()
-                Glass.objects.all().delete()
-                GlassGroup.objects.all().delete()
+                _clear_catalog()
                 messages.warning(request, "Данные очищены перед импортом.")
 
             try:
@@ -254,8 +272,7 @@ class GlassGroupAdmin(admin.ModelAdmin):
 
                     glass, _ = Glass.objects.get_or_create(group=group, name=glass_name)
                     glass.aliases_text = glass_aliases_text
-                    glass.save()
-                    sync_glass_aliases(glass)
+                    glass.save()  # алиасы синхронизирует Glass.save()
 
                 messages.success(request, "Импорт CSV завершён.")
                 return redirect("..")
@@ -268,8 +285,7 @@ class GlassGroupAdmin(admin.ModelAdmin):
         return render(request, "admin/catalog/glassgroup/import_csv.html", context)
 
     # ---------- import XLSX (3 колонки: id/бренд/взаимозаменяемое стекло) ----------
-
-    @transaction.atomic
+    # без общей транзакции: запись идёт пачками по IMPORT_BATCH_SIZE (см. _batched)
     def import_xlsx_view(self, request: HttpRequest):
         if request.method == "POST":
             uploaded = request.FILES.get("xlsx_file")
@@ -282,53 +298,100 @@ class GlassGroupAdmin(admin.ModelAdmin):
             deactivate_missing_models = bool(request.POST.get("deactivate_missing_models"))
 
             try:
-                wb = load_workbook(uploaded, data_only=True)
-                ws = wb[wb.sheetnames[0]]
-
-                header = [ws.cell(1, c).value for c in range(1, ws.max_column + 1)]
-                id_idx, brand_idx, models_idx = _find_columns_by_header(header)
-
-                created_groups = 0
-                updated_groups = 0
-                created_models = 0
-                reactivated_groups = 0
-                reactivated_models = 0
-                deactivated_groups = 0
-                deactivated_models = 0
-
-                excel_group_ids: set[str] = set()
-
-                # --- импорт/обновление групп из файла ---
-                for r in range(2, ws.max_row + 1):
-                    excel_id = ws.cell(r, id_idx + 1).value
-                    brand_cell = ws.cell(r, brand_idx + 1).value
-                    models_cell = ws.cell(r, models_idx + 1).value
-
-                    excel_id = "" if excel_id is None else str(excel_id).strip()
-                    if not excel_id:
-                        continue
+                # read_only + iter_rows: строки читаются потоком, без объектов Cell
+                wb = load_workbook(uploaded, data_only=True, read_only=True)
+                # файл открыт, пока wb не закрыт — закрываем и при ошибке в строках
+                try:
+                    ws = wb[wb.sheetnames[0]]
+                    sheet_rows = ws.iter_rows(values_only=True)
+
+                    header = list(next(sheet_rows, ()))
+                    id_idx, brand_idx, models_idx = _find_columns_by_header(header)
+                    last_idx = max(id_idx, brand_idx, models_idx)
+
+                    created_groups = 0
+                    updated_groups = 0
+                    created_models = 0
+                    reactivated_groups = 0
+                    reactivated_models = 0
+                    deactivated_groups = 0
+                    deactivated_models = 0
+
+                    excel_group_ids: set[str] = set()
+
+                    # --- читаем строки файла ---
+                    rows: list[tuple[str, str, list[str]]] = []
+                    for row in sheet_rows:
+                        # в read_only-режиме короткие строки не дополняются пустыми ячейками
+                        if len(row) <= last_idx:
+                            row = (*row, *([None] * (last_idx + 1 - len(row))))
+                        excel_id = row[id_idx]
+                        brand_cell = row[brand_idx]
+                        models_cell = row[models_idx]
+
+                        excel_id = "" if excel_id is None else str(excel_id).strip()
+                        if not excel_id:
+                            continue
 
-                    brands = _append_brand_list("" if brand_cell is None else str(brand_cell))
-                    models = _parse_models_cell("" if models_cell is None else str(models_cell))
-                    if not models:
-                        continue
+                        brands = _append_brand_list("" if brand_cell is None else str(brand_cell))
+                        models = _parse_models_cell("" if models_cell is None else str(models_cell))
+                        if not models:
+                            continue
 
+                        rows.append((excel_id, brands, models))
+                finally:
+                    wb.close()
+
+                # --- текущее состояние БД: группы и их стёкла двумя запросами ---
+                groups_by_ext: dict[str, GlassGroup] = {
+                    g.external_id: g
+                    for g in (
+                        GlassGroup.objects
+                        .filter(external_id__in={row[0] for row in rows})
+                        .only("id", "external_id", "name", "brands", "is_active")
+                    )
+                }
+                glasses_by_group: dict[int, dict[str, Glass]] = {g.pk: {} for g in groups_by_ext.values()}
+                glasses_qs = (
+                    Glass.objects
+                    .filter(group__in=list(groups_by_ext.values()))
+                    .only("id", "group_id", "name", "is_active")
+                    .order_by("name")
+                )
+                for obj in glasses_qs:
+                    glasses_by_group[obj.group_id][_normalize(obj.name)] = obj
+                initial_active: dict[int, bool] = {
+                    obj.pk: obj.is_active for by_norm in glasses_by_group.values() for obj in by_norm.values()
+                }
+
+                new_groups: list[GlassGroup] = []
+                new_group_glasses: dict[str, dict[str, Glass]] = {}
+                changed_groups: dict[int, GlassGroup] = {}
+                new_glasses: list[Glass] = []
+
+                # --- импорт/обновление групп из файла (в памяти) ---
+                for excel_id, brands, models in rows:
                     excel_group_ids.add(excel_id)
 
                     group_name = f"{models[0]} ({excel_id})"
 
-                    group, created = GlassGroup.objects.get_or_create(
-                        external_id=excel_id,
-                        defaults={"name": group_name, "brands": brands, "is_active": True},
-                    )
-
-                    if created:
+                    group = groups_by_ext.get(excel_id)
+                    if group is None:
+                        group = GlassGroup(external_id=excel_id, name=group_name, brands=brands, is_active=True)
+                        groups_by_ext[excel_id] = group
+                        new_groups.append(group)
+                        existing_by_norm = new_group_glasses[excel_id] = {}
                         created_groups += 1
                     else:
+                        if group.pk is None:
+                            existing_by_norm = new_group_glasses[excel_id]
+                        else:
+                            existing_by_norm = glasses_by_group[group.pk]
+
                         changed = False
 
                         # ре-активация группы (если ранее выключили)
-                        if hasattr(group, "is_active") and group.is_active is False:
+                        if group.is_active is False:
                             group.is_active = True
                             changed = True
                             reactivated_groups += 1
@@ -341,46 +404,81 @@ class GlassGroupAdmin(admin.ModelAdmin):
                             changed = True
 
                         if changed:
-                            group.save()
+                            if group.pk is not None:
+                                changed_groups[group.pk] = group
                             updated_groups += 1
 
                     # --- синхронизация моделей внутри группы ---
-                    desired_norms = {_normalize(m) for m in models}
-
-                    existing = list(group.glasses.all())
-                    existing_by_norm = {_normalize(g.name): g for g in existing}
+                    model_norms = [(m, _normalize(m)) for m in models]
+                    desired_norms = {nm for _m, nm in model_norms}
 
                     # add / reactivate
-                    for m in models:
-                        nm = _normalize(m)
+                    for m, nm in model_norms:
                         if nm in existing_by_norm:
                             obj = existing_by_norm[nm]
-                            if hasattr(obj, "is_active") and obj.is_active is False:
+                            if obj.is_active is False:
                                 obj.is_active = True
-                                obj.save(update_fields=["is_active"])
                                 reactivated_models += 1
                             continue
 
-                        Glass.objects.create(group=group, name=m, is_active=True)
+                        obj = Glass(group=group, name=m, is_active=True)
+                        existing_by_norm[nm] = obj
+                        new_glasses.append(obj)
                         created_models += 1
 
                     # deactivate missing models (optional)
                     if deactivate_missing_models:
                         for nm, obj in existing_by_norm.items():
-                            if nm not in desired_norms:
-                                if hasattr(obj, "is_active") and obj.is_active is True:
-                                    obj.is_active = False
-                                    obj.save(update_fields=["is_active"])
-                                    deactivated_models += 1
+                            if nm not in desired_norms and obj.is_active is True:
+                                obj.is_active = False
+                                deactivated_models += 1
+
+                # --- запись: пачками вместо save() на каждую строку ---
+                # bulk-операции не вызывают save(): флаг «ОБЩИЕ» считаем сами
+                for group in (*changed_groups.values(), *new_groups):
+                    group.brands_has_common = brands_has_common(group.brands)
+
+                to_reactivate: list[int] = []
+                to_deactivate: list[int] = []
+                for by_norm in glasses_by_group.values():
+                    for obj in by_norm.values():
+                        if obj.pk in initial_active and obj.is_active != initial_active[obj.pk]:
+                            (to_reactivate if obj.is_active else to_deactivate).append(obj.pk)
+
+                # каждая пачка — своя короткая транзакция: блокировки не держатся весь импорт
+                try:
+                    for batch in _batched(list(changed_groups.values())):
+                        with transaction.atomic():
+                            GlassGroup.objects.bulk_update(batch, ["name", "brands", "brands_has_common", "is_active"])
+                    for batch in _batched(new_groups):
+                        with transaction.atomic():
+                            GlassGroup.objects.bulk_create(batch)
+                    for batch in _batched(new_glasses):
+                        with transaction.atomic():
+                            Glass.objects.bulk_create(batch)
+                    for batch in _batched(to_reactivate):
+                        with transaction.atomic():
+                            Glass.objects.filter(pk__in=batch).update(is_active=True)
+                    for batch in _batched(to_deactivate):
+                        with transaction.atomic():
+                            Glass.objects.filter(pk__in=batch).update(is_active=False)
+                finally:
+                    if changed_groups or new_groups or new_glasses or to_reactivate or to_deactivate:
+                        # bulk_create/bulk_update/update() не шлют сигналы — кэш поиска сбрасываем явно
+                        # (и при ошибке: уже записанные пачки остаются в БД)
+                        bump_catalog_version()
 
                 # --- деактивация групп, которых больше нет в Excel ---
                 if deactivate_missing_groups:
-                    qs = GlassGroup.objects.exclude(external_id__in=excel_group_ids)
-                    for g in qs:
-                        if hasattr(g, "is_active") and g.is_active is True:
-                            g.is_active = False
-                            g.save(update_fields=["is_active"])
-                            deactivated_groups += 1
+                    # одним UPDATE; GlassGroup.save() тут не нужен — brands не меняются
+                    deactivated_groups = (
+                        GlassGroup.objects
+                        .filter(is_active=True)
+                        .exclude(external_id__in=excel_group_ids)
+                        .update(is_active=False)
+                    )
+                    if deactivated_groups:
+                        bump_catalog_version()
 
                 messages.success(
                     request,
@@ -406,13 +504,22 @@ class GlassAdmin(admin.ModelAdmin):
     autocomplete_fields = ("group",)
     ordering = ("group__name", "name")
 
+    def get_queryset(self, request):
+        # колонка group в списке читает obj.group на каждой строке
+        return super().get_queryset(request).select_related("group")
+
 
 @admin.register(GlassAlias)
 class GlassAliasAdmin(admin.ModelAdmin):
     list_display = ("alias", "glass", "get_group")
     search_fields = ("alias", "normalized_alias", "glass__name", "glass__group__name")
     autocomplete_fields = ("glass",)
-    ordering = ("alias",)
+    # страница списка идёт по уникальному индексу (glass, alias), без сортировки всей таблицы
+    ordering = ("glass_id", "alias")
+
+    def get_queryset(self, request):
+        # glass и get_group читают obj.glass.group на каждой строке
+        return super().get_queryset(request).select_related("glass__group")
 
     @admin.display(description="Группа")
     def get_group(self, obj):
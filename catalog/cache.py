@@ -0,0 +1,17 @@
+import time
+
+from django.core.cache import cache
+
+# Версия каталога: меняется при любом изменении групп/стёкол/алиасов.
+# Входит в ключи кеша, поэтому старые записи просто перестают читаться.
+CATALOG_VERSION_KEY = "catalog:version"
+
+
+def catalog_version() -> int:
+    # time_ns, а не счётчик с 1: если ключ версии вытеснят из кеша,
+    # новая версия не совпадёт со старыми ключами
+    return cache.get_or_set(CATALOG_VERSION_KEY, time.time_ns, timeout=None)
+
+
+def bump_catalog_version() -> None:
+    cache.set(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
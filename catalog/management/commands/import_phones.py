@@ -5,6 +5,9 @@ from django.db import transaction
 from catalog.models import CompatibilityGroup, PhoneModel, PhoneAlias
 
 
+ALIAS_BATCH_SIZE = 1000
+
+
 class Command(BaseCommand):
     help = "Import phone models + aliases from CSV."
 
@@ -26,9 +29,14 @@ class Command(BaseCommand):
 
         created_groups = 0
         created_models = 0
-        created_aliases = 0
         updated_models = 0
 
+        # алиасы пишем пачками; сколько реально создано — по разнице count()
+        aliases_before = PhoneAlias.objects.count()
+        alias_buf: list[PhoneAlias] = []
+        group_cache: dict[str, CompatibilityGroup] = {}
+        phone_cache: dict[tuple[str, str], PhoneModel] = {}
+
         with f:
             reader = csv.DictReader(f, delimiter=delimiter)
             required = {"brand", "model_name", "group_name"}
@@ -46,10 +54,16 @@ class Command(BaseCommand):
                 shape_key = (row.get("shape_key") or "").strip()
                 notes = (row.get("notes") or "").strip()
 
-                group, g_created = CompatibilityGroup.objects.get_or_create(
-                    name=group_name,
-                    defaults={"shape_key": shape_key, "notes": notes},
-                )
+                # повторяющиеся группы/модели берём из памяти, в БД — раз на ключ
+                group = group_cache.get(group_name)
+                if group is None:
+                    group, g_created = CompatibilityGroup.objects.get_or_create(
+                        name=group_name,
+                        defaults={"shape_key": shape_key, "notes": notes},
+                    )
+                    group_cache[group_name] = group
+                else:
+                    g_created = False
                 if g_created:
                     created_groups += 1
                 else:
@@ -63,11 +77,17 @@ class Command(BaseCommand):
                     if changed:
                         group.save()
 
-                phone, p_created = PhoneModel.objects.get_or_create(
-                    brand=brand,
-                    model_name=model_name,
-                    defaults={"group": group},
-                )
+                phone_key = (brand, model_name)
+                phone = phone_cache.get(phone_key)
+                if phone is None:
+                    phone, p_created = PhoneModel.objects.get_or_create(
+                        brand=brand,
+                        model_name=model_name,
+                        defaults={"group": group},
+                    )
+                    phone_cache[phone_key] = phone
+                else:
+                    p_created = False
                 if p_created:
                     created_models += 1
                 else:
@@ -80,14 +100,22 @@ class Command(BaseCommand):
                 if aliases_raw:
                     parts = [a.strip() for a in aliases_raw.split(aliases_sep)]
                     parts = [a for a in parts if a]
-                    for a in parts:
-                        _, a_created = PhoneAlias.objects.get_or_create(
-                            phone_model=phone,
-                            alias=a,
-                        )
-                        if a_created:
-                            created_aliases += 1
+                    alias_buf.extend(PhoneAlias(phone_model=phone, alias=a) for a in parts)
+
+                if len(alias_buf) >= ALIAS_BATCH_SIZE:
+                    self._flush_aliases(alias_buf)
+
+            self._flush_aliases(alias_buf)
+
+        created_aliases = PhoneAlias.objects.count() - aliases_before
 
         self.stdout.write(self.style.SUCCESS(
             f"Done. Groups +{created_groups}, Models +{created_models} (updated {updated_models}), Aliases +{created_aliases}"
         ))
+
+    @staticmethod
+    def _flush_aliases(alias_buf: list[PhoneAlias]) -> None:
+        # уникальность (phone_model, alias) — на стороне БД: дубликаты пропускаются
+        if alias_buf:
+            PhoneAlias.objects.bulk_create(alias_buf, batch_size=ALIAS_BATCH_SIZE, ignore_conflicts=True)
+            alias_buf.clear()
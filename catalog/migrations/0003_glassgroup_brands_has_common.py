@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-15 21:12
+
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+
+def fill_brands_has_common(apps, schema_editor):
+    GlassGroup = apps.get_model("catalog", "GlassGroup")
+    GlassGroup.objects.update(brands_has_common=Case(
+        When(brands__iregex=r"(^|,)\s*общие\s*(,|$)", then=Value(True)),
+        default=Value(False),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_glass_is_active_glassgroup_is_active'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='glassgroup',
+            name='brands_has_common',
+            field=models.BooleanField(db_index=True, default=False, editable=False, verbose_name='Бренды содержат «ОБЩИЕ»'),
+        ),
+        migrations.RunPython(fill_brands_has_common, migrations.RunPython.noop),
+    ]
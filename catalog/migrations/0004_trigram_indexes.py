@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-15 21:30
+
+from django.db import migrations
+
+# Только для Postgres: локально (SQLite) миграция ничего не делает.
+# - LIKE '%q%' по normalized_alias (поиск через __contains, значение уже в нижнем регистре)
+# - UPPER(name) LIKE UPPER('%q%') по имени стекла (так Django строит __icontains)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS glassalias_norm_trgm "
+        "ON catalog_glassalias USING gin (normalized_alias gin_trgm_ops)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS glass_name_upper_trgm "
+        "ON catalog_glass USING gin (UPPER(name::text) gin_trgm_ops)"
+    )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS glassalias_norm_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS glass_name_upper_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_glassgroup_brands_has_common'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.1 on 2026-10-15 21:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='glassalias',
+            name='normalized_alias',
+            field=models.CharField(editable=False, max_length=255, verbose_name='Нормализованный алиас'),
+        ),
+        migrations.AddIndex(
+            model_name='glassalias',
+            index=models.Index(fields=['normalized_alias'], include=('glass',), name='alias_norm_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.1 on 2026-10-15 21:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_glassalias_norm_covering_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='glass',
+            name='is_active',
+            field=models.BooleanField(default=True, verbose_name='Активно'),
+        ),
+        migrations.AddIndex(
+            model_name='glass',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['group', 'name'], name='glass_group_name_idx'),
+        ),
+    ]
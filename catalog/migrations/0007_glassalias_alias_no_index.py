@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-15 21:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_glass_active_group_name_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='glassalias',
+            name='alias',
+            field=models.CharField(max_length=255, verbose_name='Алиас'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-15 21:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_glassalias_alias_no_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='glass',
+            name='id',
+            field=models.AutoField(primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='glassgroup',
+            name='id',
+            field=models.AutoField(primary_key=True, serialize=False),
+        ),
+    ]
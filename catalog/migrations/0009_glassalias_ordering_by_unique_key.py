@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-15 22:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_int_pk_glassgroup_glass'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='glassalias',
+            options={'ordering': ['glass_id', 'alias'], 'verbose_name': 'Алиас стекла', 'verbose_name_plural': 'Алиасы стёкол'},
+        ),
+    ]
@@ -1,7 +1,21 @@
 from django.db import models
+from django.db.models import Q
+
+from shared.brands import brands_has_common
+
+from .cache import bump_catalog_version
+
+
+class GlassGroupQuerySet(models.QuerySet):
+    def with_catalog(self):
+        # стёкла групп одним запросом (на пачку групп при iterator), уже по имени
+        return self.prefetch_related(models.Prefetch("glasses", queryset=Glass.objects.order_by("name")))
 
 
 class GlassGroup(models.Model):
+    # групп и стёкол — тысячи: хватает int4 (и FK на них в алиасах уже)
+    id = models.AutoField(primary_key=True)
+
     external_id = models.CharField(
         "ID из Excel",
         max_length=64,
@@ -20,21 +34,38 @@ class GlassGroup(models.Model):
         default="",
         help_text="Например: HOCO, Profit, Baseus",
     )
+    brands_has_common = models.BooleanField(
+        "Бренды содержат «ОБЩИЕ»",
+        default=False,
+        db_index=True,
+        editable=False,
+    )
 
     is_active = models.BooleanField("Активна", default=True, db_index=True)
 
     created_at = models.DateTimeField("Дата создания", auto_now_add=True)
 
+    objects = GlassGroupQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Группа стёкол"
         verbose_name_plural = "Группы стёкол"
         ordering = ["name"]
 
+    def save(self, *args, **kwargs):
+        self.brands_has_common = brands_has_common(self.brands)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "brands" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "brands_has_common"}
+        super().save(*args, **kwargs)
+
     def __str__(self) -> str:
         return self.name
 
 
 class Glass(models.Model):
+    id = models.AutoField(primary_key=True)
+
     group = models.ForeignKey(
         GlassGroup,
         on_delete=models.CASCADE,
@@ -52,18 +83,84 @@ class Glass(models.Model):
         help_text="Например: a13; a13 5g; samsung a13",
     )
 
-    is_active = models.BooleanField("Активно", default=True, db_index=True)
+    is_active = models.BooleanField("Активно", default=True)
 
     class Meta:
         verbose_name = "Стекло"
         verbose_name_plural = "Стёкла"
         ordering = ["name"]
         unique_together = [("group", "name")]
+        indexes = [
+            # активные стёкла групп, уже по имени (API: group_id IN (...) ORDER BY name)
+            models.Index(fields=["group", "name"], condition=Q(is_active=True), name="glass_group_name_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        # aliases_text разбираем один раз здесь; поиск читает только GlassAlias
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "aliases_text" not in update_fields:
+            return
+        if adding and not self.aliases_text:
+            return
+        self.sync_aliases()
+
+    def sync_aliases(self) -> None:
+        """Приводит строки GlassAlias к aliases_text: лишние удаляет, недостающие добавляет."""
+        parts = split_aliases(self.aliases_text)
+
+        # части уже без пробелов по краям, нормализованный ключ непустой; при дублях — последнее написание
+        desired_norm_to_original: dict[str, str] = dict(zip(map(normalize_alias, parts), parts))
+
+        # normalized_alias = normalize_alias(alias): сравниваем по нему, не загружая модели
+        existing_norm_to_pk = {norm: pk for pk, norm, _glass_id in GlassAlias.objects.filter(glass=self).match_index()}
+
+        to_delete = [pk for norm, pk in existing_norm_to_pk.items() if norm not in desired_norm_to_original]
+        if to_delete:
+            GlassAlias.objects.filter(pk__in=to_delete).delete()
+
+        to_create = [
+            original
+            for norm, original in desired_norm_to_original.items()
+            if norm not in existing_norm_to_pk
+        ]
+        if to_create:
+            GlassAlias.bulk_upsert(self.pk, to_create)
+            # bulk_create не шлёт post_save — кэш поиска сбрасываем явно
+            bump_catalog_version()
 
     def __str__(self) -> str:
         return self.name
 
 
+def split_aliases(raw: str) -> list[str]:
+    # разделители в aliases_text: ; | ,
+    raw = raw or ""
+    return [v for v in map(str.strip, raw.replace("|", ";").replace(",", ";").split(";")) if v]
+
+
+def normalize_alias(alias: str) -> str:
+    return " ".join((alias or "").strip().lower().split())
+
+
+# Колонки для сопоставления алиасов (без текста alias)
+ALIAS_MATCH_FIELDS = ("id", "normalized_alias", "glass_id")
+
+
+class GlassAliasQuerySet(models.QuerySet):
+    def match_index(self):
+        # кортежи (id, normalized_alias, glass_id) без создания моделей
+        return self.values_list(*ALIAS_MATCH_FIELDS)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create не вызывает save(): normalized_alias считаем здесь, одним проходом
+        objs = list(objs)
+        for obj in objs:
+            obj.normalized_alias = normalize_alias(obj.alias)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class GlassAlias(models.Model):
     glass = models.ForeignKey(
         Glass,
@@ -72,22 +169,43 @@ class GlassAlias(models.Model):
         verbose_name="Стекло",
     )
 
-    alias = models.CharField("Алиас", max_length=255, db_index=True)
+    alias = models.CharField("Алиас", max_length=255)
     normalized_alias = models.CharField(
         "Нормализованный алиас",
         max_length=255,
-        db_index=True,
         editable=False,
     )
 
+    objects = GlassAliasQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Алиас стекла"
         verbose_name_plural = "Алиасы стёкол"
-        ordering = ["alias"]
+        # порядок по уникальному ключу (glass, alias): отдельного индекса на alias нет
+        ordering = ["glass_id", "alias"]
         unique_together = [("glass", "alias")]
+        indexes = [
+            # точное совпадение по алиасу; glass_id в INCLUDE (Postgres) —
+            # index-only scan без чтения строки. Не UNIQUE: один алиас бывает у разных стёкол
+            models.Index(fields=["normalized_alias"], include=["glass"], name="alias_norm_idx"),
+        ]
+
+    @classmethod
+    def bulk_upsert(cls, glass_id: int, aliases: list[str], batch_size: int = 500) -> list["GlassAlias"]:
+        """
+        Алиасы стекла пачками INSERT ... ON CONFLICT (glass, alias): уже существующие
+        обновляются, а не роняют вставку. normalized_alias считает bulk_create менеджера.
+        """
+        return cls.objects.bulk_create(
+            [cls(glass_id=glass_id, alias=a) for a in aliases],
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["glass", "alias"],
+            update_fields=["normalized_alias"],
+        )
 
     def save(self, *args, **kwargs):
-        self.normalized_alias = " ".join((self.alias or "").strip().lower().split())
+        self.normalized_alias = normalize_alias(self.alias)
         super().save(*args, **kwargs)
 
     def __str__(self) -> str:
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .models import Glass, GlassAlias, GlassGroup
+
+
+@receiver(post_save, sender=GlassGroup)
+@receiver(post_save, sender=Glass)
+@receiver(post_save, sender=GlassAlias)
+@receiver(post_delete, sender=GlassGroup)
+@receiver(post_delete, sender=Glass)
+@receiver(post_delete, sender=GlassAlias)
+def _catalog_changed(sender, **kwargs) -> None:
+    bump_catalog_version()
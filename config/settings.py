@@ -62,6 +62,14 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Для /api/ (см. config/wsgi.py): без сессий, auth и messages — API публичный,
+# DRF сам аутентифицирует запрос. Статику /api/ не отдаёт, WhiteNoise не нужен.
+API_MIDDLEWARE = [
+    "django.middleware.security.SecurityMiddleware",
+    "django.middleware.common.CommonMiddleware",
+    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+]
+
 ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
@@ -98,8 +106,34 @@ if USE_POSTGRES or DB_ENGINE in {"postgres", "postgresql"}:
             "PASSWORD": os.getenv("DB_PASSWORD", ""),
             "HOST": os.getenv("DB_HOST", "db"),
             "PORT": os.getenv("DB_PORT", "5432"),
+            # соединение живёт между запросами, а не открывается на каждый
+            "CONN_MAX_AGE": int(os.getenv("CONN_MAX_AGE", "600")),
+            "CONN_HEALTH_CHECKS": True,
+            # за PgBouncer в transaction-режиме серверные курсоры (iterator()) не работают
+            "DISABLE_SERVER_SIDE_CURSORS": os.getenv("DB_DISABLE_SERVER_SIDE_CURSORS", "0") == "1",
+            "OPTIONS": {},
         }
     }
+    # Серверная привязка параметров (psycopg 3): повторяющиеся запросы
+    # (поиск, импорт) после prepare_threshold выполнений идут как prepared statements.
+    # Несовместимо с PgBouncer в transaction-режиме — поэтому по желанию.
+    if os.getenv("DB_SERVER_SIDE_BINDING", "0") == "1":
+        DATABASES["default"]["OPTIONS"].update({
+            "server_side_binding": True,
+            "prepare_threshold": int(os.getenv("DB_PREPARE_THRESHOLD", "5")),
+        })
+
+    # Пул psycopg (по желанию): DB_POOL_SIZE=N — размер пула на процесс.
+    # workers * DB_POOL_SIZE не должен превышать max_connections Postgres.
+    # С пулом постоянные соединения Django не используются (CONN_MAX_AGE=0).
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "0"))
+    if DB_POOL_SIZE > 0:
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": min(4, DB_POOL_SIZE),
+            "max_size": DB_POOL_SIZE,
+            "timeout": 10,
+        }
 else:
     DATABASES = {
         "default": {
@@ -107,6 +141,27 @@ else:
             "NAME": BASE_DIR / "db.sqlite3",
         }
     }
+    # INCLUDE-колонки индексов есть только в Postgres; SQLite строит обычный индекс
+    SILENCED_SYSTEM_CHECKS = ["models.W040"]
+
+
+# -------------------------
+# Cache
+# -------------------------
+# LocMem — отдельный кеш в каждом процессе. Для нескольких воркеров лучше Redis.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "safety-glass",
+        "OPTIONS": {
+            # редкие запросы не должны раздувать память
+            "MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "5000")),
+        },
+    }
+}
+
+# TTL кеша ответов /api/search/ (секунды)
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "60"))
 
 
 # -------------------------
@@ -129,6 +184,18 @@ USE_I18N = True
 USE_TZ = True
 
 
+# -------------------------
+# REST framework
+# -------------------------
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        # ответы /api/ кодирует orjson
+        "api.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+
 # -------------------------
 # Static files
 # -------------------------
@@ -142,6 +209,11 @@ STORAGES = {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     }
 }
+# collectstatic сам готовит .gz и (с пакетом Brotli) .br — на лету ничего не сжимается.
+# После collectstatic остаются только файлы с хешем в имени, их можно кешировать на год.
+# В DEBUG статика читается из исходников без хешей — там кеш не нужен.
+WHITENOISE_KEEP_ONLY_HASHED_FILES = True
+WHITENOISE_MAX_AGE = 0 if DEBUG else 31536000
 
 
 # -------------------------
@@ -3,14 +3,114 @@ WSGI config for config project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
 
+Запросы к /api/ идут через отдельный обработчик с короткой цепочкой
+middleware (settings.API_MIDDLEWARE), остальное (админка, статика) — через полную.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
 """
 
+import logging
 import os
 
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIHandler
 from django.core.wsgi import get_wsgi_application
+from django.utils.module_loading import import_string
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_wsgi_application()
+API_PREFIX = "/api/"
+
+logger = logging.getLogger("django.request")
+
+
+class APIWSGIHandler(WSGIHandler):
+    """
+    WSGIHandler, собирающий цепочку из settings.API_MIDDLEWARE вместо MIDDLEWARE.
+
+    Цикл — копия BaseHandler.load_middleware со списком в параметре:
+    глобальный settings.MIDDLEWARE не подменяем даже на время сборки.
+    """
+
+    def load_middleware(self, is_async=False):
+        self._load_middleware_from(settings.API_MIDDLEWARE, is_async)
+
+    def _load_middleware_from(self, middleware_paths, is_async=False):
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        get_response = self._get_response_async if is_async else self._get_response
+        handler = convert_exception_to_response(get_response)
+        handler_is_async = is_async
+        for middleware_path in reversed(middleware_paths):
+            middleware = import_string(middleware_path)
+            middleware_can_sync = getattr(middleware, "sync_capable", True)
+            middleware_can_async = getattr(middleware, "async_capable", False)
+            if not middleware_can_sync and not middleware_can_async:
+                raise RuntimeError(
+                    "Middleware %s must have at least one of "
+                    "sync_capable/async_capable set to True." % middleware_path
+                )
+            elif not handler_is_async and middleware_can_sync:
+                middleware_is_async = False
+            else:
+                middleware_is_async = middleware_can_async
+            try:
+                adapted_handler = self.adapt_method_mode(
+                    middleware_is_async,
+                    handler,
+                    handler_is_async,
+                    debug=settings.DEBUG,
+                    name="middleware %s" % middleware_path,
+                )
+                mw_instance = middleware(adapted_handler)
+            except MiddlewareNotUsed as exc:
+                if settings.DEBUG:
+                    if str(exc):
+                        logger.debug("MiddlewareNotUsed(%r): %s", middleware_path, exc)
+                    else:
+                        logger.debug("MiddlewareNotUsed: %r", middleware_path)
+                continue
+            else:
+                handler = adapted_handler
+
+            if mw_instance is None:
+                raise ImproperlyConfigured(
+                    "Middleware factory %s returned None." % middleware_path
+                )
+
+            if hasattr(mw_instance, "process_view"):
+                self._view_middleware.insert(
+                    0,
+                    self.adapt_method_mode(is_async, mw_instance.process_view),
+                )
+            if hasattr(mw_instance, "process_template_response"):
+                self._template_response_middleware.append(
+                    self.adapt_method_mode(is_async, mw_instance.process_template_response),
+                )
+            if hasattr(mw_instance, "process_exception"):
+                # стек обработки исключений в Django всегда синхронный
+                self._exception_middleware.append(
+                    self.adapt_method_mode(False, mw_instance.process_exception),
+                )
+
+            handler = convert_exception_to_response(mw_instance)
+            handler_is_async = middleware_is_async
+
+        handler = self.adapt_method_mode(is_async, handler, handler_is_async)
+        # присваиваем последним: по _middleware_chain Django судит, что сборка закончена
+        self._middleware_chain = handler
+
+
+_default_application = get_wsgi_application()
+_api_application = APIWSGIHandler()
+
+
+def application(environ, start_response):
+    if environ.get("PATH_INFO", "").startswith(API_PREFIX):
+        return _api_application(environ, start_response)
+    return _default_application(environ, start_response)
@@ -0,0 +1,19 @@
+import re
+from functools import lru_cache
+
+# "ОБЩИЕ" как отдельный элемент списка брендов через запятую (регистронезависимо).
+# Шаблон совместим и с Python re, и с __iregex в БД.
+COMMON_BRAND_PATTERN = r"(^|,)\s*общие\s*(,|$)"
+_COMMON_RE = re.compile(COMMON_BRAND_PATTERN, re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
+def brands_has_common(brands: str) -> bool:
+    """
+    True, если в строке брендов есть 'ОБЩИЕ' (регистронезависимо),
+    поддерживает список через запятую.
+
+    Строки брендов у групп в основном повторяются, поэтому результат кешируется
+    (кеш ограничен по размеру).
+    """
+    return bool(_COMMON_RE.search(brands or ""))